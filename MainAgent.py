@@ -1,49 +1,167 @@
 import time
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src to path so we can import components
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+# Only lightweight modules here; vision (cv2/numpy/mss), the API client and the LLM handler
+# are imported by their initializers on background threads (see _start_components).
 from components.LogWatcher import LogWatcher
-from components.VisionProcessor import VisionProcessor
-from components.EternalReturnAPI import EternalReturnAPI
-from components.LocalLLMHandler import LocalLLMHandler
+from components.OCREngine import OCREngineError
+from components.Pipeline import ScanJob, Stage
+from components.MatchSession import MatchSession, MatchHistory
+from components.Metrics import metrics
 
 class MainAgent:
-    def __init__(self):
+    READY_TIMEOUT = 10 # Max seconds to wait for the loading screen to settle before scanning
+    RESOLVE_WORKERS = 4
+    SCAN_FRAMES = 3 # Captures used for per-region OCR consensus
+    MATCH_HISTORY = 100 # Past matches kept for repeat-opponent detection
+
+    def __init__(self, log_path=None, config_dir="config", screen=None, ocr_backend=None):
+        """
+        Defaults run against the live game. The replay harness (src/tools/replay_bench.py) passes
+        a recorded log, fixture screenshots (`screen`) and its own config instead.
+        """
         print("Initializing ERAIAdv Agent...")
-        
+        self.started = time.perf_counter()
+        self.startup_times = {} # step -> seconds (startup breakdown)
+
         # 1. Initialize Components
-        self.log_watcher = LogWatcher()
-        self.vision = VisionProcessor(config_dir="config")
-        self.api = EternalReturnAPI() # Keys loaded from .env
-        self.llm = LocalLLMHandler()
+        #    The log watcher is ready right away; the heavy components are built concurrently in
+        #    the background and only waited for by the first stage that needs them.
+        self.log_watcher = LogWatcher(log_path=log_path, patterns_file=os.path.join(config_dir, "log_patterns.json"))
+        self.startup_times["log_watcher"] = time.perf_counter() - self.started
+        self._start_components(config_dir, ocr_backend, screen)
         
         # State
         self.current_mode = "Unknown"
         self.current_region = "Unknown"
-        self.participants = {} # nickname -> stats
+        self.session = None # MatchSession of the current match (only its players go into the prompt)
+        self.match_history = MatchHistory(self.MATCH_HISTORY) # Finished matches (bounded, LRU)
+        self.current_job = None # ScanJob in flight (cancelled by newer scene changes)
+        self.scan_timings = [] # Time from loading-screen event to scan start, per match
+        self.on_advice = None # Optional callback(job) once a scan's advice has been delivered
+
+        # Speculative lookups started during character select: OCR name -> (Future, started_at)
+        self.prefetched = {}
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=self.RESOLVE_WORKERS, thread_name_prefix="prefetch")
+        self.prefetch_lock = threading.Lock()
+
+        # 2. Pipeline: log events (main thread) -> vision -> name resolution & stats -> commentary
+        #    Stages are connected by bounded queues; a full queue blocks the stage feeding it.
+        self.vision_stage = Stage("vision", self._vision_stage, maxsize=2)
+        self.resolve_stage = Stage("resolve", self._resolve_stage, maxsize=32, workers=self.RESOLVE_WORKERS)
+        self.commentary_stage = Stage("commentary", self._commentary_stage, maxsize=32)
+
+    # --- Startup ---
+
+    def _start_components(self, config_dir, ocr_backend, screen):
+        self.init_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="init")
+        self.components = {
+            "vision": self.init_executor.submit(self._timed_init, "vision", self._init_vision, config_dir, ocr_backend, screen),
+            "api": self.init_executor.submit(self._timed_init, "api", self._init_api),
+            "llm": self.init_executor.submit(self._timed_init, "llm", self._init_llm),
+        }
+        self.init_executor.shutdown(wait=False)
+
+    def _timed_init(self, name, factory, *args):
+        start = time.perf_counter()
+        component = factory(*args)
+        self.startup_times[name] = time.perf_counter() - start
+        metrics.record(f"startup.{name}", self.startup_times[name])
+        return component
+
+    def _init_vision(self, config_dir, ocr_backend, screen):
+        from components.VisionProcessor import VisionProcessor
+        # Loads the configs and the OCR models for every configured language set
+        return VisionProcessor(config_dir=config_dir, ocr_backend=ocr_backend, screen=screen)
+
+    def _init_api(self):
+        from components.EternalReturnAPI import EternalReturnAPI
+        return EternalReturnAPI() # Keys loaded from .env; player cache warm-loads in the background
+
+    def _init_llm(self):
+        from components.LocalLLMHandler import LocalLLMHandler
+        llm = LocalLLMHandler()
+        self.llm_warm_up = llm.warm_up(background=True) # Load the model now, not mid-match
+        return llm
+
+    # Components block only until their background initialization has finished
+    @property
+    def vision(self):
+        return self.components["vision"].result()
 
-    def run(self):
+    @property
+    def api(self):
+        return self.components["api"].result()
+
+    @property
+    def llm(self):
+        return self.components["llm"].result()
+
+    def _report_startup(self):
+        """Prints the startup breakdown once every component and background preload is done."""
+        for future in self.components.values():
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[Startup] Component failed to initialize: {e}")
+        ready = time.perf_counter() - self.started
+
+        preloads = {}
+        if self.components["api"].exception() is None:
+            self.api.cache.ready.wait()
+            preloads["player_cache"] = time.perf_counter() - self.started
+        if self.components["llm"].exception() is None:
+            self.llm_warm_up.join()
+            preloads["llm_model"] = time.perf_counter() - self.started
+
+        steps = ", ".join(f"{name} {secs:.2f}s" for name, secs in self.startup_times.items())
+        print(f"[Startup] Live after {self.live_after:.2f}s, components ready after {ready:.2f}s ({steps})")
+        if preloads:
+            print("[Startup] Background preloads done at: " + ", ".join(f"{k} {v:.2f}s" for k, v in preloads.items()))
+
+    def run(self, stop_event=None):
         print("Agent is running. Waiting for game events...")
+
+        for stage in (self.vision_stage, self.resolve_stage, self.commentary_stage):
+            stage.start()
         
-        # Start Log Watcher
+        # Start Log Watcher (events are handled while the other components are still loading)
         self.log_watcher.open_log()
+        self.live_after = time.perf_counter() - self.started
+        threading.Thread(target=self._report_startup, name="startup-report", daemon=True).start()
 
         try:
-            while True:
-                # 1. Check Logs
-                events = self.log_watcher.check_updates()
-                for event in events:
+            # 1. Log events are delivered as soon as the file changes
+            #    (inotify / watchdog notifications, polling fallback).
+            #    handle_log_event never blocks, so events don't pile up behind a scan.
+            for event in self.log_watcher.events(stop_event):
+                try:
                     self.handle_log_event(event)
+                except Exception as e:
+                    print(f"[Agent] Error handling {event.get('type')} event: {e}")
 
-                # 2. Manual Trigger for testing (e.g., keypress) could go here
-                # For now, we rely on Log events or manual logic.
-                
-                time.sleep(1)
+            # 2. Manual Trigger for testing (e.g., keypress) could go here
+            # For now, we rely on Log events or manual logic.
         except KeyboardInterrupt:
             print("Stopping Agent.")
+        finally:
+            self.cancel_scan()
+            for stage in (self.vision_stage, self.resolve_stage, self.commentary_stage):
+                stage.stop()
+            self.prefetch_executor.shutdown(wait=False, cancel_futures=True)
+            if self.components["api"].done() and self.components["api"].exception() is None:
+                self.api.close()
+            metrics.end_match()
+            metrics.print_summary()
+            if self.scan_timings:
+                avg = sum(self.scan_timings) / len(self.scan_timings)
+                print(f"Time-to-scan over {len(self.scan_timings)} scans: avg {avg:.2f}s, max {max(self.scan_timings):.2f}s")
 
     def handle_log_event(self, event):
         print(f"[Event] {event['type']}: {event['value']}")
@@ -52,24 +170,123 @@ class MainAgent:
             self.current_mode = event['value']
             print(f"-> Detected Mode: {self.current_mode}")
 
+        elif event['type'] == 'region':
+            self.current_region = event['value']
+
         elif event['type'] == 'state_change':
             if event['value'] == 'loading_screen':
-                print("-> Loading Screen Detected! Waiting 5s for screen to settle...")
-                time.sleep(5)  # Wait for full load
-                self.perform_scan()
+                print("-> Loading Screen Detected! Waiting for screen to settle...")
+                metrics.start_match(time.strftime("%Y%m%d-%H%M%S"))
+                # Stop the previous match's commentary before its session is archived
+                self.cancel_scan()
+                self.end_session()
+                self.session = MatchSession(self.current_mode, self.current_region)
+                # vision_map_loading.json (anchor + regions); falls back to vision_map.json
+                self.perform_scan(wait_ready=True, scene="loading", new_match=True)
+            elif event['value'] == 'char_select':
+                # Scan visible names now and look them up in the background, so the
+                # loading-screen scan only has to fetch players it hasn't seen yet
+                print("-> Character Select Detected! Prefetching visible players...")
+                metrics.start_match(time.strftime("%Y%m%d-%H%M%S"))
+                self.prefetched = {}
+                self.perform_scan(wait_ready=True, scene="char_select", prefetch=True)
+            elif event['value'] == 'lobby':
+                # Back to lobby: whatever we were scanning is stale now
+                self.cancel_scan()
+                self.prefetched = {}
+                self.end_session()
+                metrics.end_match()
+            elif self.current_job and self.current_job.cancel_if_waiting():
+                # Game started before the screen settled: there is nothing left to scan.
+                # Lookups and commentary of a scan already taken keep running.
+                print(f"-> Screen gone, cancelled scan #{self.current_job.id}")
+
+    def end_session(self):
+        """Archives the current match into the bounded history and drops its state."""
+        if self.session is not None:
+            self.match_history.archive(self.session)
+            self.session = None
+
+    def cancel_scan(self):
+        if self.current_job and not self.current_job.is_cancelled:
+            print(f"-> Cancelling scan #{self.current_job.id}")
+            self.current_job.cancel()
+
+    def perform_scan(self, wait_ready=False, scene="default", prefetch=False, new_match=False):
+        """
+        Queues a new scan (cancelling the previous one) and returns its job without blocking.
+        wait_ready: let the vision stage wait until the screen has settled before OCR.
+        prefetch: only start background lookups for the names found (no commentary).
+        new_match: reset per-match state (OCR cache stats, LLM conversation) before scanning.
+        """
+        self.cancel_scan()
+        if not prefetch and self.session is None:
+            self.session = MatchSession(self.current_mode, self.current_region)
+        job = ScanJob(scene, reason="prefetch" if prefetch else "scan",
+                      delay=self.READY_TIMEOUT if wait_ready else 0, new_match=new_match,
+                      session=None if prefetch else self.session)
+        self.current_job = job
+        self.vision_stage.put(job)
+        return job
+
+    # --- Stages ---
 
-    def perform_scan(self):
-        print("\n--- Starting Vision Scan ---")
+    def _vision_stage(self, job):
+        # Per-match resets happen here rather than in the event handler, so the log loop never
+        # waits for a component that is still initializing
+        if job.new_match:
+            if self.vision.ocr_cache:
+                self.vision.ocr_cache.reset_stats()
+            self.llm.start_match()
+
+        # Wait for the screen to settle (adaptive); a newer scene change interrupts the wait
+        if job.delay:
+            if self.vision.wait_until_ready(job.scene, timeout=job.delay, cancel_event=job.cancelled) is None:
+                return
+        if not job.begin_scan():
+            return
+
+        time_to_scan = time.time() - job.created
+        if job.reason != "prefetch":
+            self.scan_timings.append(time_to_scan)
+            metrics.record("agent.time_to_scan", time_to_scan)
+        print(f"\n--- Starting Vision Scan #{job.id} (time-to-scan: {time_to_scan:.2f}s) ---")
         
-        # 1. Capture & OCR
-        results = self.vision.scan_frame()
-        if "error" in results:
-            print(f"Vision Error: {results['error']}")
+        # 1. Capture & OCR over several frames; each region arrives once its reading is stable
+        results = {}
+        names = set()
+        try:
+            for label, text, conf in self.vision.scan_stream(job.scene, frames=self.SCAN_FRAMES):
+                if job.is_cancelled:
+                    return
+                results[label] = text
+
+                # 2. Hand each player name to the resolve stage right away,
+                #    before the rest of the board has been read
+                if "_name" in label and text and text not in names:
+                    names.add(text)
+                    if job.reason == "prefetch":
+                        self._prefetch(text)
+                    else:
+                        print(f"checking: {text}" + (f" (conf {conf})" if conf is not None else "") + "...")
+                        self.resolve_stage.put((job, text))
+        except OCREngineError as e:
+            print(f"Vision Error: {e}")
+
+        if job.reason == "prefetch":
+            print(f"Prefetching {len(names)} players from character select.")
             return
 
         print(f"Scanned {len(results)} items.")
+        if self.vision.ocr_cache:
+            print(f"OCR cache: {self.vision.ocr_cache.stats()}")
+        print(f"Found {len(self._extract_players(results))} players.")
 
-        # 2. Process Results
+        # 3. Tell the commentary stage how many players to wait for
+        job.expected = len(names)
+        self.commentary_stage.put((job, None, None, None, None))
+
+    def _extract_players(self, results):
         # Group by player (e.g., player1_name, player1_char)
         players = {}
         for key, text in results.items():
@@ -84,49 +301,104 @@ class MainAgent:
                 p_id = key.replace("_char", "")
                 if p_id not in players: players[p_id] = {}
                 players[p_id]['char'] = text
+        return players
 
-        # 3. Fetch Stats for found players
-        print(f"Found {len(players)} players. Fetching stats...")
-        
-        for p_id, info in players.items():
-            name = info.get('name')
-            char = info.get('char', 'Unknown')
-            
-            if not name: continue
+    def _prefetch(self, ocr_name):
+        """Starts a background lookup for a name seen during character select."""
+        with self.prefetch_lock:
+            if ocr_name in self.prefetched:
+                return
 
-            print(f"checking: {name} ({char})...")
-            
-            # API Call
-            uid = self.api.get_user_id(name)
-            if uid:
-                stats = self.api.get_user_stats(uid)
-                self.participants[name] = stats
-                print(f"   -> Stats: {stats}")
+            def fetch():
+                result = self.api.fetch_player(ocr_name)
+                return result, time.time()
+
+            self.prefetched[ocr_name] = (self.prefetch_executor.submit(fetch), time.time())
+
+    def _resolve_stage(self, item):
+        job, ocr_name = item
+        if job.is_cancelled:
+            return
+
+        with self.prefetch_lock:
+            prefetched = self.prefetched.get(ocr_name)
+
+        result = None
+        if prefetched:
+            # Already looked up (or in flight) since character select: just collect it
+            future, started = prefetched
+            try:
+                result, finished = future.result()
+                with self.prefetch_lock:
+                    job.prefetch_hits += 1
+                    job.prefetch_intervals.append((started, finished))
+            except Exception as e:
+                print(f"   -> Prefetch of {ocr_name} failed ({e}), fetching again.")
+
+        if result:
+            name, uid, stats = result
+        else:
+            # API Call (rate limited + cached inside EternalReturnAPI)
+            name, uid, stats = self.api.fetch_player(ocr_name)
+        self.commentary_stage.put((job, ocr_name, name if uid else None, uid, stats))
+
+    def _commentary_stage(self, item):
+        job, ocr_name, name, uid, stats = item
+        if job.is_cancelled:
+            return
+
+        session = job.session
+        if ocr_name is not None:
+            if name:
+                past = self.match_history.encounters(uid, name)
+                session.add_player(name, ocr_name, uid, stats, encounters=len(past))
+                print(f"   -> {name} Stats: {stats}")
+                if past:
+                    print(f"   -> Repeat opponent: {name} was in {len(past)} of the last {len(self.match_history)} matches")
                 
                 # TODO: Identify if this player is STRONG/WEAK based on stats
                 # logic_here(stats)
             else:
-                print("   -> User Not Found (OCR Error?)")
+                print(f"   -> {ocr_name}: User Not Found (OCR Error?)")
+            job.results[ocr_name] = stats
+
+        if job.completed or job.expected is None or len(job.results) < job.expected:
+            return # Already done / still scanning / waiting for other players
+        job.completed = True
 
-        print("--- Scan Complete ---")
+        # Loading-screen latency: event -> every player resolved (wall clock), and how much
+        # wall-clock lookup time had already elapsed during character select
+        resolved = time.time() - job.created
+        prefetch_wall = job.prefetch_wall_time()
+        metrics.record("agent.event_to_resolved", resolved)
+        print(f"Nickname index: {self.api.index_stats}")
+        print(f"Loading screen -> all {job.expected} players resolved in {resolved:.2f}s; "
+              f"{job.prefetch_hits} prefetched, lookups ran {prefetch_wall:.2f}s (wall clock) before the loading screen")
+        print(f"--- Scan #{job.id} Complete ---")
         
         # 4. Agent Commentary
-        if self.participants:
+        if len(session):
             print("Thinking (Consulting LLM)...")
-            # Build a simple text summary for the LLM
-            context = f"現在のモード: {self.current_mode}\n検出されたプレイヤー:\n"
-            for name, stats in self.participants.items():
-                if stats:
-                    context += f"- 名前: {name}, 勝率: {stats.get('win_rate')}%, 平均キル: {stats.get('avg_kills')}\n"
-                else:
-                    context += f"- 名前: {name}, データなし\n"
-            
-            context += "\nこの状況でのアドバイスをください。"
-            
-            advice = self.llm.generate_commentary(context)
-            print(f"\n[AI Advice]: {advice}\n")
+            # Print each advice sentence as soon as it is generated.
+            # Re-scans of the same lobby hit the memo / only send changed players.
+            print()
+            first = True
+            for sentence in self.llm.stream_advice(session.mode, session.participants()):
+                if job.is_cancelled:
+                    print("(advice cancelled)")
+                    break
+                if first:
+                    first = False
+                    metrics.record("agent.event_to_first_advice", time.time() - job.created)
+                print(f"[AI Advice]: {sentence}")
+                job.advice.append(sentence)
+            metrics.record("agent.event_to_advice", time.time() - job.created)
+            print(f"\nLLM usage: {self.llm.usage}\n")
         else:
             print("No participants data found to analyze.")
+        metrics.end_match()
+        if self.on_advice:
+            self.on_advice(job)
 
 if __name__ == "__main__":
     agent = MainAgent()
@@ -1,49 +1,248 @@
 import requests
 import json
 import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+
+try:
+    from components.PlayerCache import PlayerCache
+    from components.NicknameIndex import NicknameIndex
+    from components.StatsEngine import GameHistory, summarize
+    from components.GameData import GameData
+    from components.Metrics import metrics
+except ImportError:  # Running this file directly
+    from PlayerCache import PlayerCache
+    from NicknameIndex import NicknameIndex
+    from StatsEngine import GameHistory, summarize
+    from GameData import GameData
+    from Metrics import metrics
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    rate: tokens added per second, burst: bucket capacity.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 class EternalReturnAPI:
     BASE_URL = "https://open-api.bser.io"
+    MAX_RETRIES = 4
+    HISTORY_PAGES = 3 # Max /v1/user/games pages kept per user; pages after the first are backfilled
+    BACKGROUND_IDLE = 5.0 # Seconds without lookups before background requests (backfill, game data) run
+    MAX_HISTORY_GAMES = 500 # Games kept per user in the columnar history
+    MAX_HISTORIES = 256 # Users whose history is kept in memory and on disk (LRU)
+    STATS_FRESH = 10 * 60 # Cached stats older than this are served, then re-checked in the background
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None, rate_limit=None, burst=None, max_workers=8,
+                 cache_path=None, stats_ttl=None, nickname_list=None, game_data_path=None):
         self.api_key = api_key or os.getenv("ER_API_KEY")
         if not self.api_key:
             print("[Warning] ER_API_KEY is not set. API calls will fail.")
+
+        # base_url can point at a local mock server for testing
+        self.base_url = (base_url or os.getenv("ER_API_BASE_URL", self.BASE_URL)).rstrip("/")
         
         self.headers = {
             "x-api-key": self.api_key,
             "accept": "application/json"
         }
-        # Simple in-memory cache for nickname -> userNum
-        self.user_cache = {}
+
+        # Pooled keep-alive session shared by all worker threads
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # open-api.bser.io quota (requests/sec). Default keys are limited to 1 req/s.
+        rate = rate_limit or float(os.getenv("ER_API_RATE_LIMIT", "1"))
+        self.rate_limiter = TokenBucket(rate, burst or int(os.getenv("ER_API_BURST", "1")))
+
+        # Fuzzy index of known nicknames, used to snap OCR noise to real names
+        self.nickname_index = NicknameIndex()
+        self.index_stats = {"corrections": 0, "api_calls_saved": 0}
+        self.index_lock = threading.Lock()
+        nickname_list = nickname_list or os.getenv("ER_NICKNAME_LIST")
+        if nickname_list and os.path.exists(nickname_list):
+            self.nickname_index.import_file(nickname_list)
+
+        # Columnar game histories: userNum -> GameHistory (only new games are fetched on refresh)
+        self.histories = OrderedDict()
+        self.history_lock = threading.Lock()
+
+        # Work done in the background while the API is otherwise idle, so lookups only ever pay
+        # for one page: users whose cached stats went stale (newest page re-checked), and
+        # older history pages (userNum -> (next cursor, pages read))
+        self.stale = OrderedDict()
+        self.backfill = OrderedDict()
+        self.last_request = time.monotonic() # monotonic time of the last foreground request
+        self.stop_event = threading.Event()
+
+        # Persistent cache for nickname -> userNum, stats and histories (warm-loaded in the background)
+        self.cache = PlayerCache(cache_path, stats_ttl=stats_ttl, max_histories=self.MAX_HISTORIES,
+                                 on_warm_load=self.nickname_index.add_many)
+
+        self.background_thread = threading.Thread(target=self._background_loop, name="APIBackground", daemon=True)
+        self.background_thread.start()
+
+        # Static data (character/item/mode names): disk snapshot now, re-downloaded only after a game patch.
+        # The refresh only sends requests while no lookups are running (it shares their rate limit).
+        self.game_data = GameData(fetch=self._get_when_idle if self.api_key else None, directory=game_data_path)
+        if self.api_key:
+            self.game_data.refresh_async()
+
+    def close(self):
+        """Stops the background refresh and flushes pending cache writes to disk."""
+        self.stop_event.set()
+        self.cache.close()
+
+    def _get(self, path, params=None, background=False):
+        """
+        Rate-limited GET on the pooled session.
+        Retries 429 (Too Many Requests) with exponential backoff, honoring Retry-After.
+        background: request doesn't count as activity for the idle check (_background_loop).
+        Returns the final response (raises on connection errors).
+        """
+        if not background:
+            self.last_request = time.monotonic()
+        url = f"{self.base_url}{path}"
+        endpoint = "api" + re.sub(r"/\d+", "/{id}", path) # One span per endpoint, not per user
+        delay = 1.0
+        for attempt in range(self.MAX_RETRIES + 1):
+            with metrics.span("api.rate_limit_wait"):
+                self.rate_limiter.acquire()
+            with metrics.span(endpoint):
+                response = self.session.get(url, params=params, timeout=10)
+            if response.status_code != 429 or attempt == self.MAX_RETRIES:
+                return response
+            metrics.incr("api.429")
+
+            retry_after = response.headers.get("Retry-After")
+            try:
+                wait = float(retry_after) if retry_after else delay
+            except ValueError:
+                wait = delay
+            print(f"[API] Rate limited (429) on {path}, retrying in {wait:.1f}s...")
+            time.sleep(wait)
+            delay = min(delay * 2, 16)
+        return response
+
+    def _get_when_idle(self, path, params=None):
+        """
+        Background GET: waits until no foreground request was made for BACKGROUND_IDLE seconds.
+        Raises RuntimeError if the API is closed while waiting.
+        """
+        while True:
+            wait = self.last_request + self.BACKGROUND_IDLE - time.monotonic()
+            if wait <= 0:
+                return self._get(path, params=params, background=True)
+            if self.stop_event.wait(wait):
+                raise RuntimeError("API closed")
+
+    def resolve_nickname(self, nickname):
+        """
+        Resolves a (possibly OCR-noisy) nickname.
+        - A name equal to a known nickname up to letter lookalikes (l/I, O/Q, Cyrillic, ...) with
+          the same digits is snapped to it; if that one is cached no API call is made at all.
+        - Otherwise the name is looked up as read. Only if the API does not know it, it is
+          snapped to a known nickname that differs by digit lookalikes (0/O, 1/l, ...) or a few
+          edits (real players often differ by one character, so these must never replace a
+          name that exists).
+        Returns (nickname, userNum) where nickname is the corrected name, userNum may be None.
+        """
+        cached = self.cache.get_user(nickname)
+        if cached is not None:
+            metrics.incr("api.cache_hit.user")
+            return nickname, cached
+
+        corrected = self.nickname_index.lookup(nickname, fuzzy=False)
+        if corrected and corrected != nickname:
+            nickname = self._correct(nickname, corrected)
+            cached = self.cache.get_user(nickname)
+            if cached is not None:
+                metrics.incr("api.cache_hit.user")
+                with self.index_lock:
+                    self.index_stats["api_calls_saved"] += 1
+                return nickname, cached
+
+        user_num, not_found = self._fetch_user_id(nickname)
+        if not not_found:
+            return nickname, user_num
+
+        corrected = self.nickname_index.lookup(nickname)
+        if not corrected or corrected == nickname:
+            return nickname, None
+        nickname = self._correct(nickname, corrected)
+        cached = self.cache.get_user(nickname)
+        if cached is not None:
+            metrics.incr("api.cache_hit.user")
+            return nickname, cached
+        return nickname, self._fetch_user_id(nickname)[0]
+
+    def _correct(self, nickname, corrected):
+        with self.index_lock:
+            self.index_stats["corrections"] += 1
+        print(f"[API] Corrected OCR nickname: {nickname} -> {corrected}")
+        return corrected
 
     def get_user_id(self, nickname):
         """
         Fetches userNum (userId) from nickname.
         Returns userNum (int) or None if not found/error.
         """
-        if nickname in self.user_cache:
-            return self.user_cache[nickname]
+        return self.resolve_nickname(nickname)[1]
 
-        url = f"{self.BASE_URL}/v1/user/nickname"
+    def _fetch_user_id(self, nickname):
+        """
+        Looks up a nickname on the API and records it in the cache and nickname index.
+        Returns (userNum or None, not_found) where not_found is True only for a 404.
+        """
         params = {"query": nickname}
 
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._get("/v1/user/nickname", params=params)
             if response.status_code == 200:
                 data = response.json()
                 if data['code'] == 200:
                     user_num = data['user']['userNum']
-                    self.user_cache[nickname] = user_num
-                    return user_num
+                    self.cache.put_user(nickname, user_num)
+                    self.nickname_index.add(nickname)
+                    return user_num, False
+                if data['code'] == 404: # Not-found is also reported in the body with HTTP 200
+                    print(f"[API] User not found: {nickname}")
+                    return None, True
             elif response.status_code == 404:
                 print(f"[API] User not found: {nickname}")
+                return None, True
             else:
                 print(f"[API] Error fetching user ID: {response.status_code} {response.text}")
         except Exception as e:
             print(f"[API] Exception in get_user_id: {e}")
         
-        return None
+        return None, False
 
     def get_user_stats(self, user_num, season_id=0):
         """
@@ -56,56 +255,169 @@ class EternalReturnAPI:
         if not user_num:
             return None
 
-        # Fetching recent games is often more useful for "current form"
-        url = f"{self.BASE_URL}/v1/user/games/{user_num}"
-        
-        try:
-            response = requests.get(url, headers=self.headers)
-            if response.status_code == 200:
-                data = response.json()
-                if "userGames" in data:
-                    return self._summarize_stats(data["userGames"])
+        entry = self.cache.get_stats_entry(user_num)
+        if entry is not None:
+            stats, fetched_at = entry
+            metrics.incr("api.cache_hit.stats")
+            if time.time() - fetched_at > self.STATS_FRESH:
+                # Serve what we have; the newest page is checked for new games once idle
+                with self.history_lock:
+                    self.stale[user_num] = None
+            return self._attach_names(stats)
+
+        return self._attach_names(self._refresh_history(user_num))
+
+    def _history(self, user_num):
+        """GameHistory from memory, else from the persistent cache, else None. Call with history_lock held."""
+        history = self.histories.get(user_num)
+        if history is None:
+            data = self.cache.get_history(user_num)
+            if data is not None:
+                try:
+                    history = GameHistory.from_bytes(data)
+                except Exception as e:
+                    print(f"[API] Ignoring unreadable stored history of {user_num}: {e}")
+        return history
+
+    def _store_history(self, user_num, history):
+        """Keeps the history in memory and on disk, returns its summary. Call with history_lock held."""
+        history.truncate(self.MAX_HISTORY_GAMES)
+        self.histories[user_num] = history
+        self.histories.move_to_end(user_num)
+        while len(self.histories) > self.MAX_HISTORIES:
+            evicted, _ = self.histories.popitem(last=False)
+            self.backfill.pop(evicted, None)
+        self.cache.put_history(user_num, history.to_bytes())
+        return summarize(history)
+
+    def _refresh_history(self, user_num, background=False):
+        """
+        Reads the newest /v1/user/games page and adds only the games we don't have yet.
+        Fetching recent games is often more useful for "current form". Older pages are
+        backfilled when the API is idle. Returns the summarized stats (None on error).
+        """
+        with self.history_lock:
+            history = self._history(user_num)
+
+        result = self._fetch_games_page(user_num, background=background)
+        if result is None:
+            if history is None:
+                return None
+            with self.history_lock:
+                return summarize(history) # Older games only, but better than nothing
+
+        page, next_cursor = result
+        ids = [g.get("gameId") for g in page]
+        with self.history_lock:
+            if history is not None and history.latest_id in ids:
+                history.add_newer(page[:ids.index(history.latest_id)])
             else:
+                # New user, or more new games than one page: older games are backfilled
+                history = GameHistory.from_games(page)
+                if next_cursor and page:
+                    self.backfill[user_num] = (next_cursor, 1)
+            stats = self._store_history(user_num, history)
+
+        if stats:
+            self.cache.put_stats(user_num, stats)
+        return stats
+
+    def _attach_names(self, stats):
+        """Adds character names from the static data snapshot (in-memory lookups only)."""
+        if not stats:
+            return stats
+        stats["top_char"] = self.game_data.character_name(stats.get("top_char_id"))
+        for char in stats.get("characters", []):
+            char["name"] = self.game_data.character_name(char["char_id"])
+        return stats
+
+    def _fetch_games_page(self, user_num, cursor=None, background=False):
+        """
+        Reads one /v1/user/games page (newest first; `cursor` = the `next` of a previous page).
+        Returns (games, next_cursor), or None on error.
+        """
+        params = {"next": cursor} if cursor else None
+        try:
+            response = self._get(f"/v1/user/games/{user_num}", params=params, background=background)
+            if response.status_code != 200:
                 print(f"[API] Error fetching stats: {response.status_code}")
+                return None
+            data = response.json()
         except Exception as e:
             print(f"[API] Exception in get_user_stats: {e}")
-        
-        return None
+            return None
+        return data.get("userGames") or [], data.get("next")
+
+    def _background_loop(self):
+        """
+        One request at a time and only after BACKGROUND_IDLE seconds without lookups, so it
+        never delays a lobby scan by more than a single request:
+        - re-checks the newest page of users whose cached stats are older than STATS_FRESH,
+        - follows `next` for users whose history only has its first pages.
+        """
+        while not self.stop_event.wait(1.0):
+            if time.monotonic() - self.last_request < self.BACKGROUND_IDLE:
+                continue
+            with self.history_lock:
+                if self.stale:
+                    user_num, _ = self.stale.popitem(last=False)
+                    cursor = None
+                elif self.backfill:
+                    user_num, (cursor, pages) = self.backfill.popitem(last=False)
+                else:
+                    continue
+
+            if cursor is None:
+                self._refresh_history(user_num, background=True)
+                continue
+
+            result = self._fetch_games_page(user_num, cursor, background=True)
+            if result is None:
+                continue
+            page, next_cursor = result
+
+            with self.history_lock:
+                history = self.histories.get(user_num)
+                if history is None:
+                    continue
+                history.add_older(page)
+                if next_cursor and page and pages + 1 < self.HISTORY_PAGES and len(history) < self.MAX_HISTORY_GAMES:
+                    self.backfill[user_num] = (next_cursor, pages + 1)
+                stats = self._store_history(user_num, history)
+            if stats:
+                self.cache.put_stats(user_num, stats)
+
+    def fetch_player(self, nickname):
+        """
+        Resolves one nickname and fetches its stats.
+        Returns (nickname, user_num, stats); nickname is the corrected name if it was snapped.
+        """
+        with metrics.span("api.fetch_player"):
+            nickname, user_num = self.resolve_nickname(nickname)
+            stats = self.get_user_stats(user_num) if user_num else None
+        return nickname, user_num, stats
+
+    def fetch_players(self, nicknames):
+        """
+        Looks up several players concurrently (still bounded by the rate limiter).
+        Generator: yields (nickname, user_num, stats) as each player completes.
+        """
+        nicknames = list(dict.fromkeys(n for n in nicknames if n))
+        if not nicknames:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(nicknames))) as executor:
+            futures = [executor.submit(self.fetch_player, name) for name in nicknames]
+            for future in as_completed(futures):
+                yield future.result()
 
     def _summarize_stats(self, games):
         """
-        Summarizes the last 10 games into a simple structure for the LLM.
+        Summarizes a list of games into a simple structure for the LLM (see StatsEngine.summarize).
         """
         if not games:
             return None
-
-        total_games = len(games)
-        wins = 0
-        top3 = 0
-        total_kills = 0
-        most_used_chars = {}
-
-        for game in games:
-            if game['gameRank'] == 1:
-                wins += 1
-            if game['gameRank'] <= 3:
-                top3 += 1
-            total_kills += game['playerKill']
-            
-            char_num = game['characterNum']
-            most_used_chars[char_num] = most_used_chars.get(char_num, 0) + 1
-
-        # Sort chars by usage
-        sorted_chars = sorted(most_used_chars.items(), key=lambda x: x[1], reverse=True)
-        top_char = sorted_chars[0][0] if sorted_chars else "Unknown"
-
-        return {
-            "total_games": total_games,
-            "win_rate": round((wins / total_games) * 100, 1),
-            "top3_rate": round((top3 / total_games) * 100, 1),
-            "avg_kills": round(total_kills / total_games, 1),
-            "top_char_id": top_char # Ideally we'd map this ID to a Name using static data
-        }
+        return summarize(GameHistory.from_games(games))
 
 if __name__ == "__main__":
     # Test
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+
+class GameData:
+    """
+    Versioned on-disk snapshot of the static game data tables (ID -> name).
+
+    - The snapshot on disk is loaded at startup, so names resolve immediately and offline.
+    - refresh() asks /v2/data/hash for the table hashes (one request) and only downloads the
+      tables again when they changed, i.e. after a game patch.
+    - Every lookup is a plain dict access; nothing here runs on the lookup hot path.
+    """
+    DEFAULT_DIR = os.path.join("cache", "game_data")
+
+    # snapshot table -> (/v2/data meta type, id field, name field)
+    TABLES = {
+        "characters": ("Character", "code", "name"),
+        "weapons": ("ItemWeapon", "code", "name"),
+        "armors": ("ItemArmor", "code", "name"),
+        "consumables": ("ItemConsumable", "code", "name"),
+    }
+
+    # Matching modes are not served as a data table; these match the matchingMode field of /v1/user/games
+    MATCHING_MODES = {2: "Normal", 3: "Rank", 6: "Cobalt"}
+
+    def __init__(self, fetch=None, directory=None):
+        """fetch: callable(path) -> response (EternalReturnAPI._get_when_idle). None = disk only."""
+        self.fetch = fetch
+        self.directory = directory or os.getenv("ER_GAME_DATA_PATH", self.DEFAULT_DIR)
+        self.version = None
+        self.tables = {name: {} for name in self.TABLES}
+        self.tables["modes"] = dict(self.MATCHING_MODES)
+        self.lock = threading.Lock()
+        self.ready = threading.Event() # Set once refresh() has finished (even if it failed)
+        self._load_latest()
+
+    # --- Lookups ---
+
+    def name(self, table, code):
+        """Returns the name for an ID, or None if unknown."""
+        if code is None:
+            return None
+        return self.tables.get(table, {}).get(int(code))
+
+    def character_name(self, code):
+        return self.name("characters", code)
+
+    def item_name(self, code):
+        for table in ("weapons", "armors", "consumables"):
+            name = self.name(table, code)
+            if name:
+                return name
+        return None
+
+    def mode_name(self, code):
+        return self.name("modes", code)
+
+    # --- Snapshot ---
+
+    def _snapshot_path(self, version):
+        return os.path.join(self.directory, f"{version}.json")
+
+    def _load_latest(self):
+        """Loads the newest snapshot on disk, if any."""
+        if not os.path.isdir(self.directory):
+            return
+        files = [f for f in os.listdir(self.directory) if f.endswith(".json")]
+        if not files:
+            return
+        latest = max(files, key=lambda f: os.path.getmtime(os.path.join(self.directory, f)))
+        try:
+            with open(os.path.join(self.directory, latest), 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._apply(snapshot)
+            print(f"[GameData] Loaded snapshot {self.version} ({len(self.tables['characters'])} characters)")
+        except Exception as e:
+            print(f"[GameData] Error loading snapshot {latest}: {e}")
+
+    def _apply(self, snapshot):
+        tables = {name: {int(k): v for k, v in rows.items()} for name, rows in snapshot["tables"].items()}
+        tables.setdefault("modes", dict(self.MATCHING_MODES))
+        with self.lock:
+            self.tables = tables
+            self.version = snapshot["version"]
+
+    def _save(self, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(snapshot["version"])
+        tmp = path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+
+        # Older versions are no longer needed
+        for f in os.listdir(self.directory):
+            if f.endswith(".json") and os.path.join(self.directory, f) != path:
+                try:
+                    os.remove(os.path.join(self.directory, f))
+                except OSError:
+                    pass
+
+    # --- Refresh ---
+
+    def _get_data(self, path):
+        response = self.fetch(path)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: HTTP {response.status_code}")
+        data = response.json()
+        if data.get("code") != 200:
+            raise RuntimeError(f"{path}: {data.get('message')}")
+        return data.get("data")
+
+    def _remote_version(self):
+        """Version of the remote data = digest of the hashes of the tables we use."""
+        hashes = self._get_data("/v2/data/hash") or {}
+        wanted = {meta: hashes.get(meta) for meta, _, _ in self.TABLES.values()}
+        return hashlib.blake2b(json.dumps(wanted, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+    def refresh(self):
+        """Downloads the tables only if the game data changed. Returns True if a new snapshot was stored."""
+        try:
+            if self.fetch is None:
+                return False
+            version = self._remote_version()
+            if version == self.version:
+                print(f"[GameData] Snapshot {version} is up to date.")
+                return False
+
+            tables = {}
+            for name, (meta, id_field, name_field) in self.TABLES.items():
+                rows = self._get_data(f"/v2/data/{meta}") or []
+                tables[name] = {row[id_field]: row[name_field] for row in rows if id_field in row and name_field in row}
+            tables["modes"] = dict(self.MATCHING_MODES)
+
+            snapshot = {"version": version, "tables": tables}
+            self._save(snapshot)
+            self._apply(snapshot)
+            print(f"[GameData] Stored new snapshot {version} ({len(tables['characters'])} characters)")
+            return True
+        except Exception as e:
+            print(f"[GameData] Refresh failed ({e}), using snapshot {self.version}.")
+            return False
+        finally:
+            self.ready.set()
+
+    def refresh_async(self):
+        thread = threading.Thread(target=self.refresh, name="GameDataRefresh", daemon=True)
+        thread.start()
+        return thread
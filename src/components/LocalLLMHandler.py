@@ -1,32 +1,87 @@
 import requests
 import json
 import os
+import re
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from components.Metrics import metrics
+except ImportError:  # Running this file directly
+    from Metrics import metrics
 
 class LocalLLMHandler:
     DEFAULT_MODEL = "llama3"
     OLLAMA_URL = "http://localhost:11434/api/chat"
+    DEFAULT_KEEP_ALIVE = "30m" # How long Ollama keeps the model loaded after a request
+
+    # Sentence boundaries (Japanese and Latin punctuation, newlines)
+    SENTENCE_END = re.compile(r"(?<=[。！？!?\n])|(?<=\.\s)")
 
-    def __init__(self, model_name=None):
+    def __init__(self, model_name=None, ollama_url=None, keep_alive=None, memo_size=64):
         self.model = model_name or os.getenv("OLLAMA_MODEL", self.DEFAULT_MODEL)
+        # ollama_url can point at a local fake endpoint for testing
+        self.ollama_url = ollama_url or os.getenv("OLLAMA_URL", self.OLLAMA_URL)
+        self.keep_alive = keep_alive or os.getenv("OLLAMA_KEEP_ALIVE", self.DEFAULT_KEEP_ALIVE)
+
+        # /api/generate returns a `context` we can hand back to continue a conversation
+        self.generate_url = self.ollama_url.replace("/api/chat", "/api/generate")
+
+        # Pooled keep-alive HTTP session
+        self.session = requests.Session()
+
+        # Advice memo: fingerprint(mode + participant stats) -> list of sentences (LRU)
+        self.memo = OrderedDict()
+        self.memo_size = memo_size
+        self.usage = {"memo_hits": 0, "requests": 0, "delta_requests": 0, "prompt_tokens": 0}
+
+        # Per-match conversation state (see start_match)
+        self.start_match()
         print(f"[LocalLLM] Initialized using model: {self.model}")
 
-    def generate_commentary(self, context_text):
-        """
-        Sends context to the LLM and returns the generated advice/commentary.
-        """
-        prompt = self._build_system_prompt()
-        
-        payload = {
+    def _build_payload(self, context_text, stream):
+        return {
             "model": self.model,
             "messages": [
-                {"role": "system", "content": prompt},
+                {"role": "system", "content": self._build_system_prompt()},
                 {"role": "user", "content": context_text}
             ],
-            "stream": False
+            "stream": stream,
+            "keep_alive": self.keep_alive
         }
 
+    def warm_up(self, background=True):
+        """
+        Preloads the model into memory (an empty chat request makes Ollama load it),
+        so the first real request mid-match doesn't pay the model-load cost.
+        """
+        if background:
+            thread = threading.Thread(target=self.warm_up, args=(False,), name="LLMWarmUp", daemon=True)
+            thread.start()
+            return thread
+
+        payload = {"model": self.model, "messages": [], "keep_alive": self.keep_alive}
         try:
-            response = requests.post(self.OLLAMA_URL, json=payload)
+            with metrics.span("llm.warm_up"):
+                response = self.session.post(self.ollama_url, json=payload, timeout=120)
+            if response.status_code == 200:
+                print(f"[LocalLLM] Model '{self.model}' is loaded (keep_alive={self.keep_alive}).")
+                return True
+            print(f"[LocalLLM] Warm-up failed: {response.status_code} - {response.text}")
+        except Exception as e:
+            print(f"[LocalLLM] Warm-up Connection Error: {e}")
+        return False
+
+    def generate_commentary(self, context_text):
+        """
+        Sends context to the LLM and returns the generated advice/commentary.
+        """
+        payload = self._build_payload(context_text, stream=False)
+
+        try:
+            response = self.session.post(self.ollama_url, json=payload)
             if response.status_code == 200:
                 data = response.json()
                 return data.get("message", {}).get("content", "")
@@ -37,6 +92,156 @@ class LocalLLMHandler:
             print(f"[LocalLLM] Connection Error: {e}")
             return "（Ollamaに接続できません。起動していますか？）"
 
+    def stream_commentary(self, context_text, by_sentence=True):
+        """
+        Streams the advice as it is generated.
+        Generator: yields complete sentences (by_sentence=True) or raw tokens as they arrive.
+        """
+        payload = self._build_payload(context_text, stream=True)
+        yield from self._stream(self.ollama_url, payload, by_sentence)
+
+    def _stream(self, url, payload, by_sentence=True, on_done=None):
+        """
+        Posts a streaming request (/api/chat or /api/generate) and yields sentences/tokens.
+        on_done: called with the final chunk (holds `context`, token counts...).
+        Records llm.first_token (time to first token) and llm.total spans.
+        """
+        start = time.perf_counter()
+        first_token = True
+        try:
+            with self.session.post(url, json=payload, stream=True) as response:
+                if response.status_code != 200:
+                    print(f"[LocalLLM] Error: {response.status_code} - {response.text}")
+                    yield "（思考中...エラーが発生しました）"
+                    return
+
+                pending = ""
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    # /api/chat streams message.content, /api/generate streams response
+                    token = chunk.get("message", {}).get("content", "") or chunk.get("response", "")
+                    if token and first_token:
+                        first_token = False
+                        metrics.record("llm.first_token", time.perf_counter() - start)
+
+                    if not by_sentence:
+                        if token:
+                            yield token
+                    else:
+                        pending += token
+                        parts = self.SENTENCE_END.split(pending)
+                        pending = parts.pop()
+                        for sentence in parts:
+                            if sentence.strip():
+                                yield sentence.strip()
+
+                    if chunk.get("done"):
+                        if on_done:
+                            on_done(chunk)
+                        break
+
+                if by_sentence and pending.strip():
+                    yield pending.strip()
+            metrics.record("llm.total", time.perf_counter() - start)
+        except Exception as e:
+            print(f"[LocalLLM] Connection Error: {e}")
+            yield "（Ollamaに接続できません。起動していますか？）"
+
+    # --- Memoized, incremental advice ---
+
+    def start_match(self):
+        """Starts a new per-match conversation (called on each loading screen)."""
+        self.match_context = None # Ollama context tokens returned by the last request
+        self.match_mode = None
+        self.match_players = {} # name -> fingerprint of the stats already sent
+
+    def _fingerprint(self, data):
+        return hashlib.sha1(json.dumps(data, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+
+    def _format_player(self, name, stats):
+        if stats:
+            line = f"- 名前: {name}, 勝率: {stats.get('win_rate')}%, 平均キル: {stats.get('avg_kills')}"
+            if stats.get('top_char'):
+                line += f", よく使うキャラ: {stats['top_char']}"
+            form = stats.get('form')
+            if form:
+                line += f", 直近勝率: {form['win_rate']}%, 直近平均順位: {form['avg_rank']}"
+            if stats.get('rank_trend') is not None:
+                line += f", 順位傾向: {stats['rank_trend']:+}"
+            if stats.get('encounters'):
+                line += f", 最近の対戦回数: {stats['encounters']}"
+            return line + "\n"
+        return f"- 名前: {name}, データなし\n"
+
+    def build_context(self, mode, participants):
+        """Full prompt text for a mode and {name: stats}."""
+        context = f"現在のモード: {mode}\n検出されたプレイヤー:\n"
+        for name, stats in participants.items():
+            context += self._format_player(name, stats)
+        context += "\nこの状況でのアドバイスをください。"
+        return context
+
+    def stream_advice(self, mode, participants, by_sentence=True):
+        """
+        Streams advice for the current lobby.
+        - Identical (mode, participant stats) are answered from the memo without calling the LLM.
+        - Within a match only new/changed players are sent, continuing from Ollama's returned
+          context, so re-scans don't re-send (and re-evaluate) the whole prompt.
+        """
+        key = self._fingerprint({"mode": mode, "players": participants})
+        if key in self.memo:
+            self.memo.move_to_end(key)
+            self.usage["memo_hits"] += 1
+            yield from self.memo[key]
+            return
+
+        fingerprints = {name: self._fingerprint(stats) for name, stats in participants.items()}
+        changed = {name: participants[name] for name, fp in fingerprints.items() if self.match_players.get(name) != fp}
+
+        if self.match_context is None:
+            prompt = self.build_context(mode, participants)
+        else:
+            self.usage["delta_requests"] += 1
+            prompt = ""
+            if mode != self.match_mode:
+                prompt += f"現在のモード: {mode}\n"
+            if changed:
+                prompt += "新たに検出/更新されたプレイヤー:\n"
+                for name, stats in changed.items():
+                    prompt += self._format_player(name, stats)
+            prompt += "\nこの状況でのアドバイスをください。"
+
+        payload = {
+            "model": self.model,
+            "system": self._build_system_prompt(),
+            "prompt": prompt,
+            "stream": True,
+            "keep_alive": self.keep_alive
+        }
+        if self.match_context is not None:
+            payload["context"] = self.match_context
+
+        done = {}
+        sentences = []
+        self.usage["requests"] += 1
+        for part in self._stream(self.generate_url, payload, by_sentence, on_done=done.update):
+            sentences.append(part)
+            yield part
+
+        if not done:
+            return # Error / interrupted: don't remember this answer
+
+        self.usage["prompt_tokens"] += done.get("prompt_eval_count", 0)
+        self.match_context = done.get("context", self.match_context)
+        self.match_mode = mode
+        self.match_players.update(fingerprints)
+
+        self.memo[key] = sentences
+        while len(self.memo) > self.memo_size:
+            self.memo.popitem(last=False)
+
     def _build_system_prompt(self):
         return (
             "You are an AI assistant for the game 'Eternal Return'. "
@@ -49,6 +254,7 @@ class LocalLLMHandler:
 if __name__ == "__main__":
     # Test
     llm = LocalLLMHandler()
+    llm.warm_up(background=False)
     print("Testing LLM...")
-    response = llm.generate_commentary("敵プレイヤー: Hideonbush (Rio), 勝率25%, キル平均 3.5。どう動くべき？")
-    print(f"Response: {response}")
+    for sentence in llm.stream_commentary("敵プレイヤー: Hideonbush (Rio), 勝率25%, キル平均 3.5。どう動くべき？"):
+        print(f"Response: {sentence}")
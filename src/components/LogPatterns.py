@@ -0,0 +1,140 @@
+import json
+import os
+import re
+
+# Declarative registry of Player.log events.
+# Each pattern:
+#   type    - event type emitted
+#   literal - substring that must be present (used by the combined prefilter)
+#   regex   - optional regex run on the (stripped) line once the literal matched
+#   value   - constant event value, OR
+#   group   - regex group holding the value (default 1 when a regex is given)
+# Patterns are tried in registry order; the first one that matches a line wins.
+DEFAULT_PATTERNS = [
+    # 1. Matching Mode (Normal, Rank, Cobalt, etc.)
+    # User provided snippet: "GlobalUserData:SetMatchingMode ... Invoked: Normal"
+    {"type": "matching_mode", "literal": "GlobalUserData:SetMatchingMode", "regex": r"Invoked:\s*(\w+)"},
+    # 2. Match Region
+    {"type": "region", "literal": "Selected MatchingRegion", "regex": r"Selected MatchingRegion\s*:\s*(\w+)"},
+    # 3. Game State (Entering Loading Screen / Match Start)
+    {"type": "state_change", "literal": "SceneManager:LoadScene Loading", "value": "loading_screen"},
+    {"type": "state_change", "literal": "LoadScene: Loading", "value": "loading_screen"},
+    {"type": "state_change", "literal": "SceneManager:LoadScene Lobby", "value": "lobby"},
+    # Character select (used to prefetch visible players before the loading screen)
+    {"type": "state_change", "literal": "SceneManager:LoadScene CharacterSelect", "value": "char_select"},
+    # 4. In-Game State (Match Started)
+    # "GameClient created" often implies actual gameplay start
+    {"type": "state_change", "literal": "GameClient created", "value": "game_started"},
+]
+
+
+def _pattern_error(p):
+    """Returns why a registry entry is unusable, or None if it is valid."""
+    if not isinstance(p, dict):
+        return "not an object"
+    if not isinstance(p.get('type'), str) or not p['type']:
+        return "missing 'type'"
+    if not isinstance(p.get('literal'), str) or not p['literal']:
+        return "missing 'literal'"
+    if p.get('regex'):
+        try:
+            regex = re.compile(p['regex'])
+        except (re.error, TypeError) as e:
+            return f"invalid regex ({e})"
+        group = p.get('group', 1 if 'value' not in p else None)
+        if isinstance(group, int) and not 0 <= group <= regex.groups:
+            return f"regex has no group {group}"
+        if isinstance(group, str) and group not in regex.groupindex:
+            return f"regex has no group '{group}'"
+    return None
+
+
+def load_patterns(path):
+    """
+    Loads extra patterns (a JSON list in the registry format) from a config file.
+    Invalid entries are skipped with a warning so one bad entry can't stop the watcher.
+    """
+    if not path or not os.path.exists(path):
+        return []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            patterns = json.load(f)
+    except Exception as e:
+        print(f"[LogPatterns] Error loading {path}: {e}")
+        return []
+    if not isinstance(patterns, list):
+        print(f"[LogPatterns] Error loading {path}: expected a list of patterns")
+        return []
+
+    valid = []
+    for i, p in enumerate(patterns):
+        error = _pattern_error(p)
+        if error:
+            print(f"[LogPatterns] Skipping pattern #{i} in {path}: {error}")
+        else:
+            valid.append(p)
+    print(f"[LogPatterns] Loaded {len(valid)} patterns from {path}")
+    return valid
+
+
+class PatternMatcher:
+    """
+    Compiles the pattern registry once into a single-pass matcher.
+    All literals are combined into one alternation, so lines (or whole chunks) without any
+    literal are rejected with a single regex scan; only hit lines are decoded and parsed.
+    """
+
+    def __init__(self, patterns=None):
+        self.patterns = []
+        for priority, p in enumerate(patterns if patterns is not None else DEFAULT_PATTERNS):
+            regex = re.compile(p['regex']) if p.get('regex') else None
+            group = p.get('group', 1 if regex and 'value' not in p else None)
+            self.patterns.append((priority, p['type'], p['literal'], regex, group, p.get('value')))
+
+        self.by_literal = {}
+        for entry in self.patterns:
+            self.by_literal.setdefault(entry[2], []).append(entry)
+
+        # Longest literals first so overlapping literals resolve to the most specific one
+        literals = sorted(self.by_literal, key=len, reverse=True)
+        alternation = "|".join(re.escape(lit) for lit in literals) or r"(?!x)x"
+        self.prefilter = re.compile(alternation)
+        self.prefilter_bytes = re.compile(alternation.encode('utf-8'))
+
+    def parse_line(self, line):
+        """Parses a single (str) log line. Returns an event dict or None."""
+        hits = set(m.group(0) for m in self.prefilter.finditer(line))
+        if not hits:
+            return None
+        line = line.strip()
+
+        candidates = sorted((entry for lit in hits for entry in self.by_literal[lit]), key=lambda e: e[0])
+        for _, event_type, _, regex, group, value in candidates:
+            if regex:
+                match = regex.search(line)
+                if not match:
+                    continue
+                if group is not None:
+                    value = match.group(group)
+            return {"type": event_type, "value": value}
+        return None
+
+    def parse_block(self, data):
+        """
+        Parses a block of complete lines (bytes) in one pass.
+        Only lines containing a prefilter literal are decoded and parsed.
+        """
+        events = []
+        last_line_start = -1
+        for m in self.prefilter_bytes.finditer(data):
+            start = data.rfind(b"\n", 0, m.start()) + 1
+            if start == last_line_start:
+                continue # Already parsed this line
+            last_line_start = start
+            end = data.find(b"\n", m.end())
+            if end == -1:
+                end = len(data)
+            event = self.parse_line(data[start:end].decode('utf-8', errors='ignore'))
+            if event:
+                events.append(event)
+        return events
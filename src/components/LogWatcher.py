@@ -1,93 +1,233 @@
 import time
 import os
-import re
+import sys
+import select
+import threading
+
+try:
+    from components.LogPatterns import PatternMatcher, DEFAULT_PATTERNS, load_patterns
+    from components.Metrics import metrics
+except ImportError:  # Running this file directly
+    from LogPatterns import PatternMatcher, DEFAULT_PATTERNS, load_patterns
+    from Metrics import metrics
+
+class _PollWaiter:
+    """Fallback change notifier: just sleeps for a short interval."""
+    name = "polling"
+
+    def __init__(self, path, interval=0.1):
+        self.interval = interval
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+
+    def close(self):
+        pass
+
+class _InotifyWaiter:
+    """Linux change notifier using inotify (via ctypes) on the log's directory."""
+    name = "inotify"
+    IN_MODIFY, IN_MOVED_TO, IN_CREATE, IN_DELETE, IN_MOVED_FROM = 0x2, 0x80, 0x100, 0x200, 0x40
+
+    def __init__(self, path):
+        import ctypes
+        libc = ctypes.CDLL("libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE | self.IN_MOVED_FROM
+        # Watch the directory so truncation, deletion and re-creation are all seen
+        directory = os.path.dirname(os.path.abspath(path)).encode()
+        if libc.inotify_add_watch(self.fd, directory, mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                os.read(self.fd, 65536) # Drain, we only need the wake-up
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        os.close(self.fd)
+
+class _WatchdogWaiter:
+    """Cross-platform change notifier (ReadDirectoryChangesW on Windows) using the optional watchdog package."""
+    name = "watchdog"
+
+    def __init__(self, path):
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+
+        self.changed = threading.Event()
+        waiter = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                waiter.changed.set()
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), os.path.dirname(os.path.abspath(path)), recursive=False)
+        self.observer.start()
+
+    def wait(self, timeout):
+        self.changed.wait(timeout)
+        self.changed.clear()
+
+    def close(self):
+        self.observer.stop()
 
 class LogWatcher:
     # Standard path for Eternal Return logs
     LOG_PATH = os.path.expandvars(r"%USERPROFILE%\AppData\LocalLow\NimbleNeuron\Eternal Return\Player.log")
+    CHUNK_SIZE = 64 * 1024
 
-    def __init__(self, log_path=None):
+    def __init__(self, log_path=None, patterns_file=os.path.join("config", "log_patterns.json")):
         self.log_path = log_path or self.LOG_PATH
+        # Built-in patterns + user patterns from config, compiled once
+        self.matcher = PatternMatcher(DEFAULT_PATTERNS + load_patterns(patterns_file))
         self.file_handle = None
         self.where = 0
+        self.inode = None
+        self.tail = b"" # Last bytes before `where`, to detect the file being rewritten in place
+        self.buffer = b"" # Incomplete trailing line from the last read
+        self.waiter = None
 
-    def open_log(self):
+    def open_log(self, from_start=False):
         try:
-            self.file_handle = open(self.log_path, 'r', encoding='utf-8', errors='ignore')
-            # Go to the end of the file to ignore past events
-            self.file_handle.seek(0, 2)
+            self.file_handle = open(self.log_path, 'rb')
+            st = os.fstat(self.file_handle.fileno())
+            self.inode = st.st_ino
+            if not from_start:
+                # Go to the end of the file to ignore past events
+                self.file_handle.seek(0, 2)
             self.where = self.file_handle.tell()
+            self.tail = self._read_tail()
+            self.buffer = b""
             print(f"[LogWatcher] Watching log: {self.log_path}")
             return True
         except FileNotFoundError:
             print(f"[LogWatcher] Log file not found at: {self.log_path}")
             return False
 
-    def check_updates(self):
+    TAIL_SIZE = 32
+
+    def _read_tail(self):
+        start = max(0, self.where - self.TAIL_SIZE)
+        self.file_handle.seek(start)
+        tail = self.file_handle.read(self.where - start)
+        self.file_handle.seek(self.where)
+        return tail
+
+    def _check_rotation(self):
         """
-        Reads new lines from the log file.
-        Returns a list of interesting events (dictionaries).
+        Detects truncation (size shrank) or rotation/re-creation (inode changed) when the
+        game restarts, and reopens the log from the beginning.
+        Returns False if the log currently does not exist.
         """
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            return False
+
+        rotated = self.inode and st.st_ino and st.st_ino != self.inode
+        # Truncated: shrank, or was rewritten in place and already grew past our position
+        truncated = st.st_size < self.where or self._read_tail() != self.tail
+        if rotated or truncated:
+            print(f"[LogWatcher] Log {'recreated' if rotated else 'truncated'}, reopening from start.")
+            self.file_handle.close()
+            return self.open_log(from_start=True)
+        return True
+
+    def _read_block(self):
+        """Reads all newly appended data in bulk chunks and returns it as bytes ending on a line boundary."""
         if not self.file_handle:
             if not self.open_log():
-                return []
-
-        events = []
-        where = self.file_handle.tell()
-        line = self.file_handle.readline()
-        
-        while line:
-            # Analyze line content
-            event = self._parse_line(line)
-            if event:
-                events.append(event)
-            
-            line = self.file_handle.readline()
+                return b""
+        elif not self._check_rotation():
+            return b""
 
+        chunks = [self.buffer]
+        while True:
+            chunk = self.file_handle.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
         self.where = self.file_handle.tell()
-        return events
+
+        # The tail mirrors the file bytes before `where`: built from the newly read bytes only
+        # (the buffered partial line was already part of the previous tail)
+        new = b"".join(chunks[1:])
+        self.tail = (self.tail + new)[-self.TAIL_SIZE:]
+
+        data = b"".join(chunks)
+        cut = data.rfind(b"\n") + 1
+        self.buffer = data[cut:] # Keep the incomplete last line for the next read
+        return data[:cut]
+
+    def read_lines(self):
+        """Reads all newly appended data and returns complete lines."""
+        return self._read_block().decode('utf-8', errors='ignore').splitlines()
+
+    def check_updates(self):
+        """
+        Reads new lines from the log file.
+        Returns a list of interesting events (dictionaries).
+        """
+        # Single pass over the whole block; only lines hitting a pattern literal are parsed
+        with metrics.span("log.read"):
+            data = self._read_block()
+        if not data:
+            return []
+        with metrics.span("log.parse"):
+            return self.matcher.parse_block(data)
+
+    def _create_waiter(self):
+        if sys.platform.startswith("linux"):
+            try:
+                return _InotifyWaiter(self.log_path)
+            except OSError as e:
+                print(f"[LogWatcher] inotify unavailable ({e}).")
+        try:
+            return _WatchdogWaiter(self.log_path)
+        except (ImportError, OSError):
+            pass
+        return _PollWaiter(self.log_path)
+
+    def events(self, stop_event=None, max_wait=1.0):
+        """
+        Generator yielding events as soon as the log changes.
+        Wakes on file-change notifications (inotify / watchdog) and falls back to polling.
+        max_wait: upper bound between checks even without notifications.
+        """
+        if self.waiter is None:
+            self.waiter = self._create_waiter()
+            print(f"[LogWatcher] Change notification: {self.waiter.name}")
+
+        try:
+            while not (stop_event and stop_event.is_set()):
+                for event in self.check_updates():
+                    yield event
+                self.waiter.wait(max_wait)
+        finally:
+            self.waiter.close()
+            self.waiter = None
+
+    def watch(self, callback, stop_event=None):
+        """Blocking loop that calls `callback(event)` for each event."""
+        for event in self.events(stop_event):
+            callback(event)
 
     def _parse_line(self, line):
         """
-        Parses a single log line to find key events.
+        Parses a single log line to find key events (see LogPatterns.DEFAULT_PATTERNS).
         """
-        line = line.strip()
-        
-        # 1. Matching Mode (Normal, Rank, Cobalt, etc.)
-        # Example: GlobalUserData:SetMatchingMode userNum:12345 matchingMode:3 (Rank)
-        # Note: The log format changes often, need robust regex or multiple patterns.
-        # User provided snippet: "GlobalUserData:SetMatchingMode ... Invoked: Normal"
-        if "GlobalUserData:SetMatchingMode" in line:
-            match = re.search(r"Invoked:\s*(\w+)", line)
-            if match:
-                return {"type": "matching_mode", "value": match.group(1)}
-
-        # 2. Match Region
-        if "Selected MatchingRegion" in line:
-            match = re.search(r"Selected MatchingRegion\s*:\s*(\w+)", line)
-            if match:
-                return {"type": "region", "value": match.group(1)}
-
-        # 3. Game State (Entering Loading Screen / Match Start)
-        # Often indicated by scene changes or specific network messages.
-        if "SceneManager:LoadScene Loading" in line or "LoadScene: Loading" in line:
-            return {"type": "state_change", "value": "loading_screen"}
-        
-        if "SceneManager:LoadScene Lobby" in line:
-            return {"type": "state_change", "value": "lobby"}
-
-        # 4. In-Game State (Match Started)
-        # "GameClient created" often implies actual gameplay start
-        if "GameClient created" in line:
-             return {"type": "state_change", "value": "game_started"}
-
-        return None
+        return self.matcher.parse_line(line)
 
 if __name__ == "__main__":
     watcher = LogWatcher()
     print("Tail-ing log file... (Ctrl+C to stop)")
-    while True:
-        events = watcher.check_updates()
-        for e in events:
-            print(f"New Event: {e}")
-        time.sleep(1)
+    for e in watcher.events():
+        print(f"New Event: {e}")
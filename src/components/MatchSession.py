@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+class PlayerRecord:
+    """One player seen in a match (slotted: no per-instance dict)."""
+    __slots__ = ("name", "ocr_name", "user_num", "stats", "encounters")
+
+    def __init__(self, name, ocr_name=None, user_num=None, stats=None, encounters=0):
+        self.name = name
+        self.ocr_name = ocr_name
+        self.user_num = user_num
+        self.stats = stats
+        self.encounters = encounters # Past matches (in MatchHistory) this player was in
+
+class MatchSession:
+    """
+    State of the current match only. Created on each loading screen and archived into
+    MatchHistory when the match ends, so nothing accumulates across a play session.
+    Players are added by the commentary stage while the log thread may archive the session.
+    """
+    __slots__ = ("id", "mode", "region", "started", "players", "lock")
+    _ids = itertools.count(1)
+
+    def __init__(self, mode="Unknown", region="Unknown"):
+        self.id = next(self._ids)
+        self.mode = mode
+        self.region = region
+        self.started = time.time()
+        self.players = {} # name -> PlayerRecord
+        self.lock = threading.Lock()
+
+    def add_player(self, name, ocr_name=None, user_num=None, stats=None, encounters=0):
+        record = PlayerRecord(name, ocr_name, user_num, stats, encounters)
+        with self.lock:
+            self.players[name] = record
+        return record
+
+    def records(self):
+        """Snapshot of the player records."""
+        with self.lock:
+            return list(self.players.values())
+
+    def participants(self):
+        """{name: stats} for the LLM prompt; repeat opponents carry their encounter count."""
+        return {
+            record.name: {**record.stats, "encounters": record.encounters} if record.stats and record.encounters else record.stats
+            for record in self.records()
+        }
+
+    def __len__(self):
+        return len(self.players)
+
+class MatchHistory:
+    """
+    Bounded history of past matches (LRU): match id -> (mode, started, player keys).
+    Only identities are kept (userNum, or the name if unresolved), not stats.
+    An index player key -> match ids answers repeat-opponent queries without a scan.
+    Thread-safe: matches are archived from the log thread and queried from the commentary stage.
+    """
+
+    def __init__(self, max_matches=100):
+        self.max_matches = max_matches
+        self.matches = OrderedDict()
+        self.index = {} # player key -> set of match ids
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(record):
+        return record.user_num if record.user_num is not None else record.name
+
+    def archive(self, session):
+        """Stores a finished match (no-op for matches without players)."""
+        records = session.records() if session else None
+        if not records:
+            return
+        keys = frozenset(self._key(r) for r in records)
+        with self.lock:
+            self.matches[session.id] = (session.mode, session.started, keys)
+            self.matches.move_to_end(session.id)
+            for key in keys:
+                self.index.setdefault(key, set()).add(session.id)
+
+            while len(self.matches) > self.max_matches:
+                old_id, (_, _, old_keys) = self.matches.popitem(last=False)
+                for key in old_keys:
+                    ids = self.index.get(key)
+                    if ids is not None:
+                        ids.discard(old_id)
+                        if not ids:
+                            del self.index[key]
+
+    def encounters(self, user_num=None, name=None):
+        """
+        Past matches (newest first) that included the player, as (match id, mode, started).
+        Matches found here are marked as recently used.
+        """
+        key = user_num if user_num is not None else name
+        with self.lock:
+            ids = self.index.get(key)
+            if not ids:
+                return []
+            for match_id in ids:
+                self.matches.move_to_end(match_id)
+            found = [(match_id, self.matches[match_id][0], self.matches[match_id][1]) for match_id in ids]
+        return sorted(found, key=lambda m: m[2], reverse=True)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.matches)
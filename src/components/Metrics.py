@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import threading
+import time
+
+class Histogram:
+    """
+    Latency histogram with logarithmic buckets (8 per doubling, ~9% resolution) from 1µs.
+    Constant memory regardless of the number of samples.
+    """
+    BASE = 1e-6
+    STEPS = 8
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        index = int(math.log2(seconds / self.BASE) * self.STEPS) if seconds > self.BASE else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (seconds)."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.BASE * 2 ** ((index + 1) / self.STEPS), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p95_ms": round(self.percentile(95) * 1000, 2),
+            "max_ms": round(self.max * 1000, 2),
+            "total_ms": round(self.total * 1000, 2),
+        }
+
+class _Span:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, time.perf_counter() - self.start)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+class Metrics:
+    """
+    Process-wide span recorder shared by all components (see `metrics` below).
+
+    - span(name) times a block, record(name, seconds) adds a measured duration,
+      incr(name) counts an occurrence (e.g. cache hits).
+    - Samples go into per-match and per-session histograms. end_match() appends the match
+      as one JSON line to `path`; print_summary() prints p50/p95 per span for the session.
+    - Disabled by default (ER_METRICS=1 enables it); a disabled span is a shared no-op object.
+    """
+    DEFAULT_PATH = os.path.join("cache", "metrics.jsonl")
+
+    def __init__(self, enabled=None, path=None):
+        self.enabled = enabled if enabled is not None else os.getenv("ER_METRICS", "0") == "1"
+        self.path = path or os.getenv("ER_METRICS_PATH", self.DEFAULT_PATH)
+        self.lock = threading.Lock()
+        self.session = {}
+        self.session_counters = {}
+        self.match = None # Open match: {"id", "started", "spans", "counters"}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.session.get(name)
+            if hist is None:
+                hist = self.session[name] = Histogram()
+            hist.add(seconds)
+            if self.match is not None:
+                hist = self.match["spans"].get(name)
+                if hist is None:
+                    hist = self.match["spans"][name] = Histogram()
+                hist.add(seconds)
+
+    def incr(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.session_counters[name] = self.session_counters.get(name, 0) + amount
+            if self.match is not None:
+                self.match["counters"][name] = self.match["counters"].get(name, 0) + amount
+
+    # --- Per match ---
+
+    def start_match(self, match_id):
+        """Opens a match; no-op if one is already open (e.g. from character select)."""
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.match is None:
+                self.match = {"id": match_id, "started": time.time(), "spans": {}, "counters": {}}
+
+    def end_match(self):
+        """Closes the open match and appends it to the JSON lines file."""
+        if not self.enabled:
+            return
+        with self.lock:
+            match, self.match = self.match, None
+        if match is None:
+            return
+
+        line = {
+            "match": match["id"],
+            "started": round(match["started"], 3),
+            "duration_s": round(time.time() - match["started"], 3),
+            "spans": {name: hist.summary() for name, hist in sorted(match["spans"].items())},
+            "counters": match["counters"],
+        }
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[Metrics] Could not write {self.path}: {e}")
+
+    # --- Session ---
+
+    def reset(self):
+        """Drops everything recorded so far (e.g. between benchmark runs)."""
+        with self.lock:
+            self.session = {}
+            self.session_counters = {}
+            self.match = None
+
+    def session_summary(self):
+        """Returns ({span: summary}, {counter: value}) for the whole session."""
+        with self.lock:
+            spans = {name: hist.summary() for name, hist in sorted(self.session.items())}
+            return spans, dict(self.session_counters)
+
+    def print_summary(self):
+        if not self.enabled or not self.session:
+            return
+        spans, counters = self.session_summary()
+        rows = list(spans.items())
+
+        width = max(len("span"), max(len(name) for name, _ in rows))
+        print(f"\n{'span'.ljust(width)}  {'count':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'max ms':>9}")
+        for name, s in rows:
+            print(f"{name.ljust(width)}  {s['count']:>6}  {s['p50_ms']:>9.2f}  {s['p95_ms']:>9.2f}  {s['max_ms']:>9.2f}")
+        if counters:
+            print("counters: " + ", ".join(f"{k}={v}" for k, v in sorted(counters.items())))
+
+metrics = Metrics()
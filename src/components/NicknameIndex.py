@@ -0,0 +1,162 @@
+import threading
+import unicodedata
+
+# OCR confusables: characters Tesseract commonly mixes up, folded to one representative.
+# Applied after NFKC (which already folds full-width Latin/digits to ASCII).
+# Digits are never folded into each other: Tiger776 and Tiger779 are different players.
+CONFUSABLES = str.maketrans({
+    # Latin / digits
+    "0": "o", "O": "o", "Q": "o",
+    "1": "l", "I": "l", "i": "l", "|": "l", "!": "l",
+    "5": "s", "S": "s", "$": "s",
+    "8": "b", "B": "b",
+    "2": "z", "Z": "z",
+    "9": "g", "q": "g",
+    "_": "ー",
+    # Cyrillic / Greek lookalikes
+    "а": "a", "е": "e", "о": "o", "р": "p", "с": "c", "х": "x", "у": "y", "к": "k",
+    "α": "a", "ο": "o", "ρ": "p", "ν": "v",
+    # Katakana vs Kanji / Hiragana lookalikes
+    "一": "ー", "―": "ー", "‐": "ー", "-": "ー",
+    "口": "ロ", "力": "カ", "工": "エ", "夕": "タ", "卜": "ト", "二": "ニ", "八": "ハ",
+    "へ": "ヘ", "べ": "ベ", "ぺ": "ペ", "り": "リ",
+    # Hangul jamo-like confusion with Latin/Katakana
+    "ㅇ": "o", "ㅣ": "l",
+})
+
+
+def normalize_nickname(name):
+    """Folds width, case and OCR confusables so lookalike spellings share one key."""
+    name = unicodedata.normalize("NFKC", name).strip().replace(" ", "")
+    name = name.translate(CONFUSABLES)
+    return name.lower()
+
+
+def _digits(name):
+    return "".join(c for c in unicodedata.normalize("NFKC", name) if c.isdigit())
+
+
+def levenshtein(a, b, max_distance=None):
+    """Edit distance between two strings (stops early once max_distance is exceeded)."""
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class NicknameIndex:
+    """
+    BK-tree of known nicknames (keyed by their normalized form) used to snap noisy OCR
+    output to the closest real nickname before spending an API call on it.
+    """
+
+    def __init__(self, max_distance=2):
+        self.max_distance = max_distance
+        self.root = None # [key, {distance: child}]
+        self.names = {} # normalized key -> set of original nicknames
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(v) for v in self.names.values())
+
+    def add(self, nickname):
+        if not nickname:
+            return
+        key = normalize_nickname(nickname)
+        with self.lock:
+            if key in self.names:
+                self.names[key].add(nickname)
+                return
+            self.names[key] = {nickname}
+
+            if self.root is None:
+                self.root = [key, {}]
+                return
+            node = self.root
+            while True:
+                d = levenshtein(key, node[0])
+                child = node[1].get(d)
+                if child is None:
+                    node[1][d] = [key, {}]
+                    return
+                node = child
+
+    def add_many(self, nicknames):
+        for nickname in nicknames:
+            self.add(nickname)
+
+    def import_file(self, path):
+        """Bulk-imports nicknames from a text file (one per line). Returns the number read."""
+        with open(path, 'r', encoding='utf-8') as f:
+            names = [line.strip() for line in f if line.strip()]
+        self.add_many(names)
+        print(f"[NicknameIndex] Imported {len(names)} nicknames from {path}")
+        return len(names)
+
+    def _threshold(self, key):
+        # Short names tolerate fewer edits, otherwise everything is 2 edits from everything
+        return min(self.max_distance, max(1, len(key) // 4))
+
+    def lookup(self, nickname, fuzzy=True):
+        """
+        Returns the known nickname matching `nickname`, or None if there is no match or the
+        best match is ambiguous.
+        - Names equal after confusable normalization match (OCR lookalikes only). With
+          fuzzy=False the digits must also be the same, so a letter/digit lookalike
+          (KOREAI vs KOREA1, Player25 vs PlayerZS) is not taken for a known player.
+        - fuzzy=True additionally allows digit lookalikes and a few edits. Callers should only
+          use that for names the API does not know, since real players often differ by a
+          character or two. Candidates whose digits differ are never fuzzy-matched by edits
+          (Tiger777 vs Tiger778).
+        """
+        key = normalize_nickname(nickname)
+        if not key:
+            return None
+
+        with self.lock:
+            if key in self.names:
+                exact = self.names[key]
+                if not fuzzy:
+                    digits = _digits(nickname)
+                    exact = {name for name in exact if _digits(name) == digits}
+                if nickname in exact:
+                    return nickname
+                if len(exact) == 1:
+                    return next(iter(exact))
+                if fuzzy:
+                    return None # Ambiguous lookalike
+            if not fuzzy or self.root is None:
+                return None
+
+            limit = self._threshold(key)
+            best_d, best_keys = limit + 1, []
+            stack = [self.root]
+            while stack:
+                node_key, children = stack.pop()
+                d = levenshtein(key, node_key)
+                if d < best_d:
+                    best_d, best_keys = d, [node_key]
+                elif d == best_d:
+                    best_keys.append(node_key)
+                for cd, child in children.items():
+                    if d - limit <= cd <= d + limit:
+                        stack.append(child)
+
+            if best_d > limit or len(best_keys) != 1 or len(self.names[best_keys[0]]) != 1:
+                return None
+            match = next(iter(self.names[best_keys[0]]))
+            if _digits(match) and _digits(nickname) and _digits(match) != _digits(nickname):
+                return None
+            return match
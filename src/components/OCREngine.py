@@ -0,0 +1,244 @@
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+DEFAULT_LANG = "eng+jpn+kor+chi_sim+chi_tra"
+
+
+class OCREngineError(Exception):
+    """Raised when the OCR backend itself is unusable (missing binary, missing traineddata...)."""
+    pass
+
+
+class OCRBackend:
+    """
+    Common interface for OCR backends used by VisionProcessor.
+    Images are single-channel numpy arrays (already preprocessed).
+    """
+    name = "base"
+    workers = 1
+
+    def preload(self, langs=None):
+        """Loads models ahead of time so the first scan does not pay for it."""
+        pass
+
+    def recognize(self, image, lang=DEFAULT_LANG, psm=7, whitelist=None):
+        """Returns the recognized text for a single image."""
+        raise NotImplementedError
+
+    def recognize_with_conf(self, image, lang=DEFAULT_LANG, psm=7, whitelist=None):
+        """Returns (text, mean confidence 0-100) for a single image."""
+        words = self.recognize_words(image, lang=lang, psm=psm, whitelist=whitelist)
+        if not words:
+            return "", 0.0
+        text = " ".join(w['text'] for w in words)
+        return text, sum(w['conf'] for w in words) / len(words)
+
+    def recognize_words(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None):
+        """
+        Returns word-level results for an image as a list of dicts:
+        {"text", "conf", "x", "y", "w", "h"}. Used by the batched (tiled page) scan.
+        """
+        raise NotImplementedError
+
+    def detect_script(self, image):
+        """
+        Returns the dominant script name (tesseract OSD, e.g. "Latin", "Hangul", "Japanese", "Han")
+        or None if it cannot be determined.
+        """
+        return None
+
+    def close(self):
+        pass
+
+
+class PytesseractBackend(OCRBackend):
+    """
+    Fallback backend: spawns one tesseract process per call via pytesseract.
+    Slow (the traineddata is reloaded on every call) but has no extra dependency.
+    """
+    name = "pytesseract"
+
+    def __init__(self):
+        import pytesseract
+        self.pytesseract = pytesseract
+
+    def _config(self, psm, whitelist):
+        config = f'--psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist={whitelist}'
+        return config
+
+    def recognize(self, image, lang=DEFAULT_LANG, psm=7, whitelist=None):
+        try:
+            return self.pytesseract.image_to_string(image, lang=lang, config=self._config(psm, whitelist)).strip()
+        except self.pytesseract.TesseractNotFoundError:
+            raise OCREngineError("Tesseract executable not found. Please install Tesseract and add to PATH.")
+
+    def recognize_words(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None):
+        try:
+            data = self.pytesseract.image_to_data(image, lang=lang, config=self._config(psm, whitelist),
+                                                  output_type=self.pytesseract.Output.DICT)
+        except self.pytesseract.TesseractNotFoundError:
+            raise OCREngineError("Tesseract executable not found. Please install Tesseract and add to PATH.")
+
+        words = []
+        for i, text in enumerate(data['text']):
+            text = text.strip()
+            if not text:
+                continue
+            words.append({
+                "text": text,
+                "conf": float(data['conf'][i]),
+                "x": data['left'][i], "y": data['top'][i],
+                "w": data['width'][i], "h": data['height'][i],
+            })
+        return words
+
+    def detect_script(self, image):
+        try:
+            osd = self.pytesseract.image_to_osd(image, output_type=self.pytesseract.Output.DICT)
+        except self.pytesseract.TesseractNotFoundError:
+            raise OCREngineError("Tesseract executable not found. Please install Tesseract and add to PATH.")
+        except self.pytesseract.TesseractError:
+            return None # Too few characters for OSD
+        return osd.get('script')
+
+
+class TesserocrPoolBackend(OCRBackend):
+    """
+    Warm pool of in-process tesseract API instances (tesserocr).
+    Each instance loads its traineddata once; regions are recognized without spawning a process.
+    Instances are kept per language set, so regions with different `lang` settings don't
+    force a re-Init of a shared engine.
+    """
+    name = "tesserocr"
+
+    def __init__(self, workers=None, tessdata_path=None):
+        import tesserocr
+        from PIL import Image
+        self.tesserocr = tesserocr
+        self.Image = Image
+        self.workers = workers or max(1, min(4, os.cpu_count() or 1))
+        self.tessdata_path = tessdata_path or os.getenv("TESSDATA_PREFIX")
+        self._pools = {}  # lang -> Queue of PyTessBaseAPI
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _create_api(self, lang):
+        kwargs = {"lang": lang}
+        if lang == "osd":
+            kwargs["psm"] = self.tesserocr.PSM.OSD_ONLY
+        if self.tessdata_path:
+            kwargs["path"] = self.tessdata_path
+        try:
+            api = self.tesserocr.PyTessBaseAPI(**kwargs)
+        except RuntimeError as e:
+            raise OCREngineError(f"Failed to initialize tesseract for '{lang}': {e}")
+        self._all.append(api)
+        return api
+
+    def _get_pool(self, lang):
+        with self._lock:
+            pool = self._pools.get(lang)
+            if pool is None:
+                pool = queue.Queue()
+                for _ in range(self.workers):
+                    pool.put(self._create_api(lang))
+                self._pools[lang] = pool
+            return pool
+
+    def preload(self, langs=None):
+        for lang in langs or [DEFAULT_LANG]:
+            self._get_pool(lang)
+        print(f"[OCREngine] tesserocr pool ready ({self.workers} workers x {len(self._pools)} language sets).")
+
+    @contextmanager
+    def _acquire(self, lang):
+        pool = self._get_pool(lang)
+        api = pool.get()
+        try:
+            yield api
+        finally:
+            pool.put(api)
+
+    def _setup(self, api, image, psm, whitelist):
+        api.SetPageSegMode(psm)
+        api.SetVariable("tessedit_char_whitelist", whitelist or "")
+        api.SetImage(self.Image.fromarray(image))
+
+    def recognize(self, image, lang=DEFAULT_LANG, psm=7, whitelist=None):
+        with self._acquire(lang) as api:
+            self._setup(api, image, psm, whitelist)
+            text = api.GetUTF8Text()
+            api.Clear()
+        return text.strip()
+
+    def recognize_with_conf(self, image, lang=DEFAULT_LANG, psm=7, whitelist=None):
+        with self._acquire(lang) as api:
+            self._setup(api, image, psm, whitelist)
+            text = api.GetUTF8Text().strip()
+            conf = float(api.MeanTextConf()) if text else 0.0
+            api.Clear()
+        return text, conf
+
+    def recognize_words(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None):
+        RIL = self.tesserocr.RIL
+        words = []
+        with self._acquire(lang) as api:
+            self._setup(api, image, psm, whitelist)
+            api.Recognize()
+            for r in self.tesserocr.iterate_level(api.GetIterator(), RIL.WORD):
+                text = (r.GetUTF8Text(RIL.WORD) or "").strip()
+                if not text:
+                    continue
+                x1, y1, x2, y2 = r.BoundingBox(RIL.WORD)
+                words.append({
+                    "text": text,
+                    "conf": r.Confidence(RIL.WORD),
+                    "x": x1, "y": y1, "w": x2 - x1, "h": y2 - y1,
+                })
+            api.Clear()
+        return words
+
+    def detect_script(self, image):
+        with self._acquire("osd") as api:
+            api.SetImage(self.Image.fromarray(image))
+            osd = api.DetectOrientationScript()
+            api.Clear()
+        return osd.get('script_name') if osd else None
+
+    def close(self):
+        with self._lock:
+            for api in self._all:
+                api.End()
+            self._all = []
+            self._pools = {}
+
+
+BACKENDS = {
+    "tesserocr": TesserocrPoolBackend,
+    "pytesseract": PytesseractBackend,
+}
+
+
+def create_ocr_backend(name=None, **kwargs):
+    """
+    Creates the requested OCR backend ("auto", "tesserocr" or "pytesseract").
+    "auto" prefers the warm tesserocr pool and falls back to pytesseract if it is not installed.
+    """
+    name = name or os.getenv("OCR_BACKEND", "auto")
+
+    if name == "auto":
+        try:
+            return TesserocrPoolBackend(**kwargs)
+        except ImportError:
+            print("[OCREngine] tesserocr not installed, falling back to pytesseract (one process per region).")
+            return PytesseractBackend()
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    if name == "pytesseract":
+        return PytesseractBackend()
+    return BACKENDS[name](**kwargs)
@@ -0,0 +1,105 @@
+import itertools
+import queue
+import threading
+import time
+
+class ScanJob:
+    """
+    One scan of the screen and everything downstream of it (lookups, commentary).
+    A newer scene change cancels the job; every stage drops work of cancelled jobs.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, scene="default", reason="", delay=0, new_match=False, session=None):
+        self.id = next(self._ids)
+        self.scene = scene
+        self.reason = reason
+        self.delay = delay # Max seconds the vision stage waits for the screen to settle (0 = scan now)
+        self.new_match = new_match # First scan of a match: per-match state is reset before it runs
+        self.session = session # MatchSession the resolved players are added to
+        self.created = time.time()
+        self.cancelled = threading.Event()
+        self.scanning = False # Set once the screen has settled and OCR started
+        self.lock = threading.Lock()
+        self.expected = None # Number of players the vision stage found (None = not scanned yet)
+        self.results = {} # name -> stats (None if not found)
+        self.completed = False # Set once commentary has run for this job
+        self.advice = [] # Advice sentences delivered for this job
+        self.prefetch_hits = 0 # Players whose lookup was started during character select
+        self.prefetch_intervals = [] # (started, finished) wall-clock times of those lookups
+
+    def prefetch_wall_time(self):
+        """
+        Wall-clock seconds during which prefetched lookups were running before this job was
+        created (union of the lookup intervals, so concurrent lookups are not double counted).
+        """
+        total = 0.0
+        end = None
+        for start, finish in sorted(self.prefetch_intervals):
+            finish = min(finish, self.created)
+            if end is not None:
+                start = max(start, end)
+            if finish > start:
+                total += finish - start
+            end = finish if end is None else max(end, finish)
+        return total
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def begin_scan(self):
+        """Marks the wait for the screen as over. Returns False if the job was cancelled."""
+        with self.lock:
+            if self.is_cancelled:
+                return False
+            self.scanning = True
+            return True
+
+    def cancel_if_waiting(self):
+        """Cancels the job only while it is still waiting for the screen. Returns True if cancelled."""
+        with self.lock:
+            if self.scanning or self.is_cancelled:
+                return False
+            self.cancel()
+            return True
+
+    @property
+    def is_cancelled(self):
+        return self.cancelled.is_set()
+
+class Stage:
+    """
+    Worker thread(s) consuming a bounded queue.
+    put() blocks while the queue is full, which applies backpressure to the previous stage.
+    """
+    def __init__(self, name, handler, maxsize=16, workers=1):
+        self.name = name
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.threads = [
+            threading.Thread(target=self._loop, name=f"{name}-{i}", daemon=True) for i in range(workers)
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def stop(self, timeout=2):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            try:
+                self.handler(item)
+            except Exception as e:
+                print(f"[Pipeline] Error in stage '{self.name}': {e}")
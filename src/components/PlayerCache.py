@@ -0,0 +1,215 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class PlayerCache:
+    """
+    Persistent cache for nickname -> userNum, summarized player stats and game histories.
+
+    - Lookups only touch the in-memory LRU, never the disk.
+    - Writes are queued and persisted to SQLite by a background thread (write-behind).
+    - At startup the most recently used entries are warm-loaded into memory, so frequent
+      opponents resolve with zero network calls.
+    - userNums are kept indefinitely, stats expire after `stats_ttl` seconds.
+    - Game histories (GameHistory blobs) don't expire: newer games are added on top of them,
+      so a restart doesn't mean refetching every player from scratch.
+    - Memory and disk are bounded to `max_entries` rows per table, `max_histories` for
+      histories (LRU eviction).
+    """
+    DEFAULT_PATH = os.path.join("cache", "player_cache.db")
+
+    def __init__(self, path=None, stats_ttl=None, max_entries=5000, max_histories=256, on_warm_load=None):
+        self.path = path or os.getenv("ER_CACHE_PATH", self.DEFAULT_PATH)
+        self.stats_ttl = stats_ttl if stats_ttl is not None else float(os.getenv("ER_STATS_TTL", 6 * 3600))
+        self.max_entries = max_entries
+        self.max_histories = max_histories
+        self.on_warm_load = on_warm_load # Called with the warm-loaded nicknames
+
+        self.users = OrderedDict() # nickname -> userNum
+        self.stats = OrderedDict() # userNum -> (stats, fetched_at)
+        self.histories = OrderedDict() # userNum -> GameHistory blob
+        self.lock = threading.Lock()
+
+        self.ready = threading.Event() # Set once warm-load has finished
+        self.writes = queue.Queue()
+        self.writer = threading.Thread(target=self._writer_loop, name="PlayerCacheWriter", daemon=True)
+        self.writer.start()
+
+    # --- Lookups (memory only) ---
+
+    def get_user(self, nickname):
+        with self.lock:
+            user_num = self.users.get(nickname)
+            if user_num is None:
+                return None
+            self.users.move_to_end(nickname)
+        self.writes.put(("touch_user", (nickname, time.time())))
+        return user_num
+
+    def get_stats(self, user_num):
+        """Returns cached stats if present and not older than the TTL, else None."""
+        entry = self.get_stats_entry(user_num)
+        return entry[0] if entry else None
+
+    def get_stats_entry(self, user_num):
+        """Like get_stats, but returns (stats, fetched_at)."""
+        with self.lock:
+            entry = self.stats.get(user_num)
+            if entry is None:
+                return None
+            if time.time() - entry[1] > self.stats_ttl:
+                del self.stats[user_num]
+                return None
+            self.stats.move_to_end(user_num)
+            return entry
+
+    def get_history(self, user_num):
+        """Returns the stored GameHistory blob, or None."""
+        with self.lock:
+            data = self.histories.get(user_num)
+            if data is not None:
+                self.histories.move_to_end(user_num)
+            return data
+
+    # --- Updates (memory now, disk later) ---
+
+    def put_user(self, nickname, user_num):
+        with self.lock:
+            self.users[nickname] = user_num
+            self.users.move_to_end(nickname)
+            while len(self.users) > self.max_entries:
+                self.users.popitem(last=False)
+        self.writes.put(("user", (nickname, user_num, time.time())))
+
+    def put_stats(self, user_num, stats):
+        now = time.time()
+        with self.lock:
+            self.stats[user_num] = (stats, now)
+            self.stats.move_to_end(user_num)
+            while len(self.stats) > self.max_entries:
+                self.stats.popitem(last=False)
+        self.writes.put(("stats", (user_num, json.dumps(stats, ensure_ascii=False), now)))
+
+    def put_history(self, user_num, data):
+        with self.lock:
+            self.histories[user_num] = data
+            self.histories.move_to_end(user_num)
+            while len(self.histories) > self.max_histories:
+                self.histories.popitem(last=False)
+        self.writes.put(("history", (user_num, sqlite3.Binary(data), time.time())))
+
+    def flush(self):
+        """Blocks until every queued write has been persisted."""
+        self.writes.join()
+
+    def close(self):
+        self.writes.put(None)
+        self.writer.join(timeout=5)
+
+    # --- Background thread ---
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS users (nickname TEXT PRIMARY KEY, user_num INTEGER, last_used REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS stats (user_num INTEGER PRIMARY KEY, data TEXT, fetched_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS histories (user_num INTEGER PRIMARY KEY, data BLOB, updated REAL)")
+        return conn
+
+    def _warm_load(self, conn):
+        """Loads the most recently used users, still-valid stats and recent histories into memory."""
+        users = conn.execute(
+            "SELECT nickname, user_num FROM users ORDER BY last_used DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        stats = conn.execute(
+            "SELECT user_num, data, fetched_at FROM stats WHERE fetched_at > ? ORDER BY fetched_at DESC LIMIT ?",
+            (time.time() - self.stats_ttl, self.max_entries)
+        ).fetchall()
+        histories = conn.execute(
+            "SELECT user_num, data FROM histories ORDER BY updated DESC LIMIT ?", (self.max_histories,)
+        ).fetchall()
+
+        with self.lock:
+            # Oldest first so the most recent end up at the MRU end; entries added meanwhile win
+            for nickname, user_num in reversed(users):
+                self.users.setdefault(nickname, user_num)
+            for user_num, data, fetched_at in reversed(stats):
+                self.stats.setdefault(user_num, (json.loads(data), fetched_at))
+            for user_num, data in reversed(histories):
+                self.histories.setdefault(user_num, bytes(data))
+        print(f"[PlayerCache] Warm-loaded {len(users)} users, {len(stats)} stats and {len(histories)} histories from {self.path}")
+        if self.on_warm_load:
+            self.on_warm_load([nickname for nickname, _ in users])
+
+    def _writer_loop(self):
+        conn = None
+        try:
+            conn = self._connect()
+            self._warm_load(conn)
+        except Exception as e:
+            print(f"[PlayerCache] Disk cache unavailable ({e}), running memory-only.")
+        self.ready.set()
+
+        while True:
+            op = self.writes.get()
+            if op is None:
+                self.writes.task_done()
+                break
+
+            # Drain whatever else is queued and write it in a single transaction
+            batch = [op]
+            while True:
+                try:
+                    nxt = self.writes.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self.writes.put(None)
+                    self.writes.task_done()
+                    break
+                batch.append(nxt)
+
+            if conn is not None:
+                try:
+                    self._write_batch(conn, batch)
+                except Exception as e:
+                    print(f"[PlayerCache] Write failed: {e}")
+            for _ in batch:
+                self.writes.task_done()
+
+        if conn is not None:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        with conn:
+            for kind, args in batch:
+                if kind == "user":
+                    conn.execute("INSERT OR REPLACE INTO users VALUES (?, ?, ?)", args)
+                elif kind == "touch_user":
+                    conn.execute("UPDATE users SET last_used = ? WHERE nickname = ?", (args[1], args[0]))
+                elif kind == "stats":
+                    conn.execute("INSERT OR REPLACE INTO stats VALUES (?, ?, ?)", args)
+                elif kind == "history":
+                    conn.execute("INSERT OR REPLACE INTO histories VALUES (?, ?, ?)", args)
+
+            # Keep the disk bounded as well (LRU by last use / fetch time)
+            conn.execute(
+                "DELETE FROM users WHERE nickname NOT IN (SELECT nickname FROM users ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+            conn.execute(
+                "DELETE FROM stats WHERE fetched_at < ? OR user_num NOT IN "
+                "(SELECT user_num FROM stats ORDER BY fetched_at DESC LIMIT ?)",
+                (time.time() - self.stats_ttl, self.max_entries)
+            )
+            conn.execute(
+                "DELETE FROM histories WHERE user_num NOT IN (SELECT user_num FROM histories ORDER BY updated DESC LIMIT ?)",
+                (self.max_histories,)
+            )
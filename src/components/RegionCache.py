@@ -0,0 +1,83 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class RegionCache:
+    """
+    LRU cache of OCR results keyed by (region label, hash of the preprocessed ROI).
+    Unchanged regions between consecutive scans return their cached text without OCR.
+
+    mode:
+      "exact"      - blake2b of the ROI pixels, only identical crops hit.
+      "perceptual" - 128-bit average hash of the ROI, hits when the hamming distance
+                     to a cached entry of the same label is <= tolerance bits.
+    """
+
+    def __init__(self, max_entries=512, mode="exact", tolerance=4):
+        self.max_entries = max_entries
+        self.mode = mode
+        self.tolerance = tolerance
+        self.entries = OrderedDict() # (label, variant, hash) -> text
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _hash(self, roi):
+        if self.mode == "perceptual":
+            small = cv2.resize(roi, (16, 8), interpolation=cv2.INTER_AREA)
+            bits = (small > small.mean()).flatten()
+            return int.from_bytes(np.packbits(bits).tobytes(), "big")
+        h = hashlib.blake2b(roi.tobytes(), digest_size=16)
+        h.update(str(roi.shape).encode())
+        return h.digest()
+
+    def key(self, label, roi, variant=""):
+        """Builds the cache key for a region. `variant` should encode OCR settings (lang, psm...)."""
+        return (label, variant, self._hash(roi))
+
+    def get(self, key):
+        """Returns the cached text for a key, or None on a miss."""
+        with self._lock:
+            text = self.entries.get(key)
+            if text is None and self.mode == "perceptual":
+                label, variant, h = key
+                for (l, v, other), cached in reversed(self.entries.items()):
+                    if l == label and v == variant and bin(h ^ other).count("1") <= self.tolerance:
+                        key, text = (l, v, other), cached
+                        break
+
+            if text is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self.entries[key] = text
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+            "entries": len(self.entries),
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
@@ -0,0 +1,160 @@
+import io
+
+import numpy as np
+
+# Columns kept from /v1/user/games entries: column -> (API field, dtype)
+COLUMNS = {
+    "game_id": ("gameId", np.int64),
+    "rank": ("gameRank", np.int16),
+    "kills": ("playerKill", np.int16),
+    "assists": ("playerAssistant", np.int16),
+    "damage": ("damageToPlayer", np.float32),
+    "character": ("characterNum", np.int32),
+    "mmr_gain": ("mmrGain", np.float32),
+}
+
+
+class GameHistory:
+    """
+    Columnar game history of one user (newest game first, like the API).
+    Every column is a NumPy array of equal length.
+    """
+
+    def __init__(self, columns=None):
+        self.columns = columns or {name: np.empty(0, dtype=dtype) for name, (_, dtype) in COLUMNS.items()}
+
+    def __len__(self):
+        return len(self.columns["game_id"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def latest_id(self):
+        return int(self.columns["game_id"][0]) if len(self) else None
+
+    @staticmethod
+    def _to_columns(games):
+        return {
+            name: np.fromiter((g.get(field) or 0 for g in games), dtype=dtype, count=len(games))
+            for name, (field, dtype) in COLUMNS.items()
+        }
+
+    @classmethod
+    def from_games(cls, games):
+        return cls(cls._to_columns(games))
+
+    def add_newer(self, games):
+        """
+        Prepends games newer than what we already have (only unseen gameIds are added).
+        Returns the number of games added.
+        """
+        if not games:
+            return 0
+        new = self._to_columns(games)
+        keep = ~np.isin(new["game_id"], self.columns["game_id"])
+        if not keep.any():
+            return 0
+        for name in self.columns:
+            self.columns[name] = np.concatenate([new[name][keep], self.columns[name]])
+        return int(keep.sum())
+
+    def add_older(self, games):
+        """
+        Appends games older than what we already have (e.g. a later history page).
+        Returns the number of games added.
+        """
+        if not games:
+            return 0
+        old = self._to_columns(games)
+        keep = ~np.isin(old["game_id"], self.columns["game_id"])
+        if not keep.any():
+            return 0
+        for name in self.columns:
+            self.columns[name] = np.concatenate([self.columns[name], old[name][keep]])
+        return int(keep.sum())
+
+    def truncate(self, max_games):
+        """Keeps only the newest `max_games` games."""
+        if len(self) > max_games:
+            for name in self.columns:
+                self.columns[name] = self.columns[name][:max_games]
+
+    def to_bytes(self):
+        """Compressed .npz blob of the columns (stored in PlayerCache)."""
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **self.columns)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Inverse of to_bytes. Columns missing from an older blob are filled with zeros."""
+        with np.load(io.BytesIO(data)) as stored:
+            size = len(stored["game_id"])
+            return cls({
+                name: stored[name].astype(dtype) if name in stored.files else np.zeros(size, dtype=dtype)
+                for name, (_, dtype) in COLUMNS.items()
+            })
+
+
+def _distribution(values):
+    return {
+        "mean": round(float(values.mean()), 1),
+        "median": round(float(np.median(values)), 1),
+        "p90": round(float(np.percentile(values, 90)), 1),
+        "std": round(float(values.std()), 1),
+    }
+
+
+def summarize(history, half_life=10, top_chars=3, trend_window=20):
+    """
+    Computes summary metrics for the LLM from a GameHistory, fully vectorized.
+    Keeps the original keys (total_games, win_rate, top3_rate, avg_kills, top_char_id) and adds:
+    - form: recency-weighted win/top-3 rate and average placement (weight halves every `half_life` games)
+    - characters: most played characters with games and win rate each
+    - kills / damage: distribution (mean, median, p90, std)
+    - rank_trend: slope of placement per game over the last `trend_window` games
+                  (negative = placing better over time), and summed MMR change
+    """
+    n = len(history)
+    if not n:
+        return None
+
+    rank = history["rank"].astype(np.float32)
+    wins = rank == 1
+    top3 = rank <= 3
+    kills = history["kills"].astype(np.float32)
+
+    # Recency weights (index 0 = newest game)
+    weights = 0.5 ** (np.arange(n, dtype=np.float32) / half_life)
+    weights /= weights.sum()
+
+    # Per-character usage and win rate
+    chars, inverse, counts = np.unique(history["character"], return_inverse=True, return_counts=True)
+    char_wins = np.bincount(inverse, weights=wins)
+    order = np.argsort(-counts, kind="stable")[:top_chars]
+
+    # Placement trend (oldest -> newest over the window)
+    window = rank[:trend_window][::-1]
+    slope = float(np.polyfit(np.arange(len(window)), window, 1)[0]) if len(window) >= 3 else 0.0
+
+    return {
+        "total_games": n,
+        "win_rate": round(float(wins.mean()) * 100, 1),
+        "top3_rate": round(float(top3.mean()) * 100, 1),
+        "avg_kills": round(float(kills.mean()), 1),
+        "top_char_id": int(chars[order[0]]),
+        "form": {
+            "win_rate": round(float(weights @ wins) * 100, 1),
+            "top3_rate": round(float(weights @ top3) * 100, 1),
+            "avg_rank": round(float(weights @ rank), 1),
+        },
+        "characters": [
+            {"char_id": int(chars[i]), "games": int(counts[i]), "win_rate": round(float(char_wins[i] / counts[i]) * 100, 1)}
+            for i in order
+        ],
+        "kills": _distribution(kills),
+        "damage": _distribution(history["damage"]),
+        "rank_trend": round(slope, 2),
+        "mmr_change": round(float(history["mmr_gain"].sum()), 1),
+    }
@@ -2,29 +2,69 @@ import json
 import time
 import cv2
 import numpy as np
-import pytesseract
 import mss
 import os
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from components.OCREngine import create_ocr_backend, OCREngineError, DEFAULT_LANG
+    from components.RegionCache import RegionCache
+    from components.Metrics import metrics
+except ImportError:  # Running this file directly
+    from OCREngine import create_ocr_backend, OCREngineError, DEFAULT_LANG
+    from RegionCache import RegionCache
+    from Metrics import metrics
 
 class VisionProcessor:
-    def __init__(self, config_dir="config"):
+    def __init__(self, config_dir="config", ocr_backend=None, cache_mode="exact", screen=None):
         self.config_dir = config_dir
-        self.sct = mss.mss()
+        # screen: mss-compatible source (monitors + grab); the replay harness serves fixture images
+        self.sct = screen or mss.mss()
+        self.probe_monitors = screen is None # Re-enumerate via a fresh mss instance (see _current_monitor)
+        self.monitor = None # Cached primary monitor geometry
+        self.monitor_checked = 0.0
         self.regions_map = {} # scene_name -> regions_dict
+        self.scene_settings = {} # scene_name -> options from the "_settings" key (e.g. {"batch": true})
+        self.capture_plans = {} # scene_name -> precompiled clamped rects + grab rectangles
+        self.ready_templates = {} # template path -> grayscale anchor image for readiness checks
+
+        # Long-lived OCR engine (models are loaded once here, not per region)
+        self.ocr = create_ocr_backend(ocr_backend)
+        self.ocr_executor = ThreadPoolExecutor(max_workers=self.ocr.workers) if self.ocr.workers > 1 else None
+        print(f"[VisionProcessor] OCR backend: {self.ocr.name}")
+
+        # Per-region OCR result cache (None disables it)
+        self.ocr_cache = RegionCache(mode=cache_mode) if cache_mode else None
         
         # Load default if exists
         self.load_config("vision_map.json", "default")
         self.load_config("vision_map_char_select.json", "char_select")
         self.load_config("vision_map_loading.json", "loading")
 
+        # Load every language set the configured regions need up front
+        self.ocr.preload(self._configured_langs())
+
+    def _configured_langs(self):
+        """Language sets (and OSD) used by the loaded region profiles."""
+        langs = {DEFAULT_LANG}
+        for plan in self.capture_plans.values():
+            for profile in plan["profiles"].values():
+                langs.add(profile['lang'])
+                if profile['detect_script']:
+                    langs.add("osd")
+                    langs.update(self.SCRIPT_LANGS.values())
+        return sorted(langs)
+
     def load_config(self, filename, scene_name):
         """Loads a region config file and assigns it to a scene name."""
         path = os.path.join(self.config_dir, filename)
         if os.path.exists(path):
             try:
                 with open(path, 'r', encoding='utf-8') as f:
-                    self.regions_map[scene_name] = json.load(f)
+                    regions = json.load(f)
+                self.scene_settings[scene_name] = regions.pop("_settings", {})
+                self.regions_map[scene_name] = regions
+                self.capture_plans[scene_name] = self._compile_plan(regions, self._current_monitor(), self.scene_settings[scene_name])
                 print(f"[VisionProcessor] Loaded config '{filename}' for scene '{scene_name}' ({len(self.regions_map[scene_name])} regions).")
             except Exception as e:
                 print(f"[VisionProcessor] Error loading {filename}: {e}")
@@ -44,65 +84,497 @@ class VisionProcessor:
         img = cv2.cvtColor(img, cv2.COLOR_BGRA2BGR)
         return img
 
-    def scan_frame(self, scene_name="default"):
-        """Captures screen and returns text for regions defined in the specified scene."""
+    MONITOR_REFRESH = 2.0 # Seconds between re-reads of the monitor geometry
+
+    def _current_monitor(self):
+        """
+        Returns the primary monitor geometry, re-read at most every MONITOR_REFRESH seconds
+        so resolution changes are picked up without enumerating monitors on every grab.
+        """
+        now = time.monotonic()
+        if self.monitor is None or now - self.monitor_checked >= self.MONITOR_REFRESH:
+            if self.probe_monitors:
+                # mss caches the monitor list per instance; a short-lived instance re-enumerates
+                with mss.mss() as probe:
+                    monitors = probe.monitors
+            else:
+                monitors = self.sct.monitors
+            # monitor[1] is usually the primary
+            self.monitor = dict(monitors[1])
+            self.monitor_checked = now
+        return self.monitor
+
+    # Fixed per-grab cost expressed in pixels; merging two grabs is worth it while the
+    # extra (unused) pixels in the merged box cost less than one more grab call.
+    GRAB_OVERHEAD_PX = 200 * 200
+
+    # Per-region OCR/preprocessing settings. Each key can be overridden in the scene's
+    # "_settings" (scene-wide default) or on an individual region in the vision_map JSON.
+    DEFAULT_PROFILE = {
+        "lang": DEFAULT_LANG,
+        "psm": 7,             # 7: Treat the image as a single text line
+        "scale": 2.0,         # Upscaling factor (helps small text)
+        "threshold": 180,     # Binary threshold (0-255) or "otsu"
+        "whitelist": None,    # e.g. "0123456789" for numeric regions
+        "detect_script": False, # Pick the smallest language set via script detection first
+    }
+
+    # Script name reported by tesseract OSD -> language set to use for full recognition
+    SCRIPT_LANGS = {
+        "Latin": "eng",
+        "Hangul": "kor",
+        "Japanese": "jpn",
+        "Katakana": "jpn",
+        "Hiragana": "jpn",
+        "Han": "chi_sim+chi_tra+jpn",
+    }
+
+    def _compile_plan(self, regions, monitor, settings=None):
+        """
+        Compiles a scene's regions into a capture plan for the given monitor geometry:
+        clamped rects and OCR profile per label and a minimal set of grab rectangles covering them.
+        """
+        settings = settings or {}
+        scene_profile = {k: settings[k] for k in self.DEFAULT_PROFILE if k in settings}
+        w_img, h_img = monitor['width'], monitor['height']
+        rects = {}
+        profiles = {}
+        for label, rect in regions.items():
+            # rect format: {x, y, w, h}
+            x, y, w, h = rect.get('x'), rect.get('y'), rect.get('w'), rect.get('h')
+
+            if x is None: continue # Skip invalid
+
+            # Safe cropping (handle boundaries)
+            x = max(0, min(x, w_img - 1))
+            y = max(0, min(y, h_img - 1))
+            w = max(1, min(w, w_img - x))
+            h = max(1, min(h, h_img - y))
+            rects[label] = (x, y, w, h)
+            profiles[label] = {**self.DEFAULT_PROFILE, **scene_profile,
+                               **{k: rect[k] for k in self.DEFAULT_PROFILE if k in rect}}
+
+        # Greedy merge: start with one grab per region, merge while it lowers total cost
+        groups = [((x, y, x + w, y + h), [label]) for label, (x, y, w, h) in rects.items()]
+        cost = lambda b: (b[2] - b[0]) * (b[3] - b[1]) + self.GRAB_OVERHEAD_PX
+        merged = True
+        while merged and len(groups) > 1:
+            merged = False
+            best = None
+            for i in range(len(groups)):
+                for j in range(i + 1, len(groups)):
+                    a, b = groups[i][0], groups[j][0]
+                    box = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                    gain = cost(a) + cost(b) - cost(box)
+                    if gain > 0 and (best is None or gain > best[0]):
+                        best = (gain, i, j, box)
+            if best:
+                _, i, j, box = best
+                groups[i] = (box, groups[i][1] + groups[j][1])
+                del groups[j]
+                merged = True
+
+        grabs = [{"box": box, "labels": labels} for box, labels in groups]
+        return {
+            "regions": regions,
+            "geometry": (monitor['left'], monitor['top'], w_img, h_img),
+            "rects": rects,
+            "profiles": profiles,
+            "grabs": grabs,
+        }
+
+    def _get_plan(self, scene_name, regions):
+        """Returns the scene's capture plan, recompiling it if regions or resolution changed."""
+        monitor = self._current_monitor()
+        geometry = (monitor['left'], monitor['top'], monitor['width'], monitor['height'])
+        plan = self.capture_plans.get(scene_name)
+        if not plan or plan["regions"] is not regions or plan["geometry"] != geometry:
+            if plan and plan["geometry"] != geometry:
+                print(f"[VisionProcessor] Resolution changed to {geometry[2]}x{geometry[3]}, recompiling capture plan for '{scene_name}'.")
+            plan = self._compile_plan(regions, monitor, self.scene_settings.get(scene_name))
+            self.capture_plans[scene_name] = plan
+        return plan
+
+    def capture_regions(self, plan, labels=None):
+        """
+        Grabs only the pixels listed in the capture plan and returns grayscale crops per label.
+        The raw BGRA buffer is viewed (not copied) and converted straight to grayscale.
+        labels: optional subset of regions; grab rectangles not covering any of them are skipped.
+        """
+        left, top = plan["geometry"][:2]
+        crops = {}
+        for grab in plan["grabs"]:
+            wanted = grab["labels"] if labels is None else [l for l in grab["labels"] if l in labels]
+            if not wanted:
+                continue
+            x1, y1, x2, y2 = grab["box"]
+            shot = self.sct.grab({"left": left + x1, "top": top + y1, "width": x2 - x1, "height": y2 - y1})
+            bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+            gray = cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY)
+            for label in wanted:
+                x, y, w, h = plan["rects"][label]
+                crops[label] = gray[y - y1:y - y1 + h, x - x1:x - x1 + w]
+        return crops
+
+    def set_batch_mode(self, scene_name, enabled):
+        """Switches a scene between batched (one tiled OCR pass) and per-region OCR."""
+        self.scene_settings.setdefault(scene_name, {})["batch"] = bool(enabled)
+        self.capture_plans.pop(scene_name, None)
+
+    def _frame_signature(self, plan):
+        """Cheap per-frame fingerprint: every region downsampled to 16x4 gray pixels."""
+        crops = self.capture_regions(plan)
+        return np.concatenate([
+            cv2.resize(crop, (16, 4), interpolation=cv2.INTER_AREA).ravel() for crop in crops.values()
+        ]).astype(np.float32)
+
+    def _anchor_score(self, settings):
+        """
+        Optional template match on an anchor region ("ready_template" image + "ready_rect" in
+        the scene's _settings). Returns the best normalized correlation, or None if not configured.
+        """
+        template_path, rect = settings.get("ready_template"), settings.get("ready_rect")
+        if not template_path or not rect:
+            return None
+        template = self.ready_templates.get(template_path)
+        if template is None:
+            template = cv2.imread(os.path.join(self.config_dir, template_path), cv2.IMREAD_GRAYSCALE)
+            if template is None:
+                print(f"[VisionProcessor] Ready template not found: {template_path}")
+                settings.pop("ready_template")
+                return None
+            self.ready_templates[template_path] = template
+
+        monitor = self._current_monitor()
+        shot = self.sct.grab({"left": monitor['left'] + rect['x'], "top": monitor['top'] + rect['y'],
+                              "width": rect['w'], "height": rect['h']})
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        gray = cv2.cvtColor(bgra, cv2.COLOR_BGRA2GRAY)
+        if gray.shape[0] < template.shape[0] or gray.shape[1] < template.shape[1]:
+            return None
+        return float(cv2.matchTemplate(gray, template, cv2.TM_CCOEFF_NORMED).max())
+
+    def wait_until_ready(self, scene_name="default", timeout=10.0, interval=0.2, stable_checks=2,
+                         max_diff=3.0, min_contrast=8.0, min_anchor=0.8, cancel_event=None):
+        """
+        Polls the scene's regions at a few Hz and returns as soon as the screen has settled:
+        - consecutive frame signatures differ by less than `max_diff` (mean abs, 0-255) for
+          `stable_checks` checks in a row,
+        - the regions are not blank (a black/white transition frame is stable too),
+        - the anchor template matches, if one is configured.
+        Returns the seconds waited, or None if `cancel_event` was set. On timeout it returns
+        the elapsed time anyway so the caller still scans.
+        """
+        scene_name, regions = self._resolve_scene(scene_name)
+        start = time.time()
+        if not regions:
+            return 0.0
+        plan = self._get_plan(scene_name, regions)
+        settings = self.scene_settings.get(scene_name, {})
+
+        previous = None
+        stable = 0
+        checks = 0
+        while True:
+            signature = self._frame_signature(plan)
+            checks += 1
+            if previous is not None and signature.size == previous.size:
+                settled = float(np.abs(signature - previous).mean()) < max_diff
+                settled = settled and float(signature.std()) >= min_contrast
+                if settled:
+                    anchor = self._anchor_score(settings)
+                    settled = anchor is None or anchor >= min_anchor
+                stable = stable + 1 if settled else 0
+            previous = signature
+
+            elapsed = time.time() - start
+            if stable >= stable_checks:
+                print(f"[VisionProcessor] Screen settled after {elapsed:.2f}s ({checks} checks).")
+                return elapsed
+            if elapsed >= timeout:
+                print(f"[VisionProcessor] Screen did not settle within {timeout:.1f}s, scanning anyway.")
+                return elapsed
+
+            if cancel_event is not None:
+                if cancel_event.wait(interval):
+                    return None
+            else:
+                time.sleep(interval)
+
+    def _resolve_scene(self, scene_name):
+        """Returns (scene_name, regions), falling back to the default scene."""
         regions = self.regions_map.get(scene_name)
         
         # Fallback to default if scene specific not found, or error
         if not regions:
+            scene_name = "default"
             regions = self.regions_map.get("default")
+        return scene_name, regions
+
+    def scan_frame(self, scene_name="default", batch=None):
+        """
+        Captures screen and returns text for regions defined in the specified scene.
+        batch: None uses the scene's "_settings.batch" option, True/False forces a mode.
+        """
+        requested = scene_name
+        scene_name, regions = self._resolve_scene(scene_name)
         
         if not regions:
-            return {"error": f"No regions configured for scene '{scene_name}' and no default found."}
+            return {"error": f"No regions configured for scene '{requested}' and no default found."}
+
+        plan = self._get_plan(scene_name, regions)
+
+        # 1. Grab only the configured regions + preprocess them
+        with metrics.span("vision.capture"):
+            crops = self.capture_regions(plan)
+        profiles = plan["profiles"]
+        with metrics.span("vision.preprocess"):
+            prepared = {label: self._preprocess(roi, profiles[label]) for label, roi in crops.items()}
+
+        if batch is None:
+            batch = self.scene_settings.get(scene_name, {}).get("batch", False)
 
-        img = self.capture_screen()
+        # 2. Unchanged regions are answered from the cache
         results = {}
+        keys = {}
+        if self.ocr_cache:
+            for label, roi in list(prepared.items()):
+                keys[label] = self.ocr_cache.key(label, roi, self._profile_variant(profiles[label]))
+                cached = self.ocr_cache.get(keys[label])
+                if cached is not None:
+                    metrics.incr("vision.cache_hit")
+                    results[label] = cached
+                    del prepared[label]
 
-        for label, rect in regions.items():
-            # rect format: {x, y, w, h}
-            x, y, w, h = rect.get('x'), rect.get('y'), rect.get('w'), rect.get('h')
+        # 3. Run OCR on the warm engine (in parallel when the backend has a worker pool)
+        try:
+            jobs = {label: (roi, self._resolve_profile(roi, profiles[label])) for label, roi in prepared.items()}
+            if not jobs:
+                recognized = {}
+            elif batch:
+                with metrics.span("vision.ocr.batch"):
+                    recognized = self._recognize_batched(jobs)
+            elif self.ocr_executor:
+                futures = {label: self.ocr_executor.submit(self._timed_recognize, label, roi, profile) for label, (roi, profile) in jobs.items()}
+                recognized = {label: f.result() for label, f in futures.items()}
+            else:
+                recognized = {label: self._timed_recognize(label, roi, profile) for label, (roi, profile) in jobs.items()}
+        except OCREngineError as e:
+            print(f"[Error] {e}")
+            return {"error": "Tesseract not found"}
 
-            if x is None: continue # Skip invalid
+        if self.ocr_cache:
+            for label, text in recognized.items():
+                self.ocr_cache.put(keys[label], text)
 
-            # Safe cropping (handle boundaries)
-            h_img, w_img = img.shape[:2]
-            x = max(0, min(x, w_img))
-            y = max(0, min(y, h_img))
-            w = max(1, min(w, w_img - x))
-            h = max(1, min(h, h_img - y))
+        results.update(recognized)
+        # Keep the configured region order
+        return {label: results[label] for label in crops if label in results}
 
-            roi = img[y:y+h, x:x+w]
-
-            # Preprocessing for better OCR
-            # 1. Grayscale
-            gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-            
-            # 2. Rescaling (upscaling helps small text)
-            gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-
-            # 3. Thresholding (Assume white text on dark background for games)
-            #    Adjust threshold as needed. 150-200 is often good for white text.
-            _, thresh = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY)
-            
-            # 4. Invert if needed? Tesseract likes black text on white bg usually.
-            #    Let's invert to make it black text on white.
-            thresh = cv2.bitwise_not(thresh)
-
-            # Run OCR
-            # psm 7: Treat the image as a single text line.
-            # lang='eng+jpn+kor+chi_sim+chi_tra': Support Multi-language
-            try:
-                text = pytesseract.image_to_string(thresh, lang='eng+jpn+kor+chi_sim+chi_tra', config='--psm 7').strip()
-            except pytesseract.TesseractNotFoundError:
-                print("[Error] Tesseract executable not found. Please install Tesseract and add to PATH.")
-                return {"error": "Tesseract not found"}
-            except Exception as e:
-                text = "" # Fail silently for partial errors
-            
-            results[label] = text
+    def scan_stream(self, scene_name="default", frames=3, min_conf=80.0, agree=2, interval=0.15):
+        """
+        Multi-frame OCR with per-region consensus.
+        Generator: yields (label, text, confidence) for each region the moment it stabilizes,
+        so downstream lookups can start before the whole board has been read.
+
+        A region is final when:
+        - its first reading has confidence >= min_conf (or its pixels hit the OCR cache), or
+        - the same text has been read `agree` times across frames, or
+        - `frames` captures have been used; the text with the highest summed confidence wins.
+        Only regions that are still low-confidence or disagreeing are captured and OCR'd again.
+        In batch mode (_settings.batch / set_batch_mode) each frame's pending regions are
+        tiled into one page; confidence is then the mean word confidence of the region.
+        """
+        scene_name, regions = self._resolve_scene(scene_name)
+        if not regions:
+            return
+
+        plan = self._get_plan(scene_name, regions)
+        profiles = plan["profiles"]
+        batch = self.scene_settings.get(scene_name, {}).get("batch", False)
+        pending = set(plan["rects"])
+        votes = {label: {} for label in pending} # label -> text -> [count, conf_sum]
+        keys = {}
+
+        for frame in range(frames):
+            if frame:
+                time.sleep(interval)
+            with metrics.span("vision.capture"):
+                crops = self.capture_regions(plan, pending)
+            with metrics.span("vision.preprocess"):
+                prepared = {label: self._preprocess(roi, profiles[label]) for label, roi in crops.items()}
+
+            if self.ocr_cache and frame == 0:
+                for label, roi in list(prepared.items()):
+                    keys[label] = self.ocr_cache.key(label, roi, self._profile_variant(profiles[label]))
+                    cached = self.ocr_cache.get(keys[label])
+                    if cached is not None:
+                        metrics.incr("vision.cache_hit")
+                        pending.discard(label)
+                        del prepared[label]
+                        yield label, cached, None
+
+            jobs = {label: (roi, self._resolve_profile(roi, profiles[label])) for label, roi in prepared.items()}
+            if batch:
+                # One tiled page per frame holding only the regions that are still pending
+                with metrics.span("vision.ocr.batch"):
+                    readings = self._recognize_batched(jobs, with_conf=True).items() if jobs else []
+            elif self.ocr_executor:
+                futures = {self.ocr_executor.submit(self._timed_recognize, label, roi, profile, True): label
+                           for label, (roi, profile) in jobs.items()}
+                readings = ((futures[f], f.result()) for f in as_completed(futures))
+            else:
+                readings = ((label, self._timed_recognize(label, roi, profile, True)) for label, (roi, profile) in jobs.items())
+
+            last = frame == frames - 1
+            for label, (text, conf) in readings:
+                vote = votes[label].setdefault(text, [0, 0.0])
+                vote[0] += 1
+                vote[1] += conf
+                if not (last or (frame == 0 and conf >= min_conf) or vote[0] >= agree):
+                    continue
+
+                if vote[0] >= agree or frame == 0:
+                    best = text # Agreed on, or confident on the first frame
+                else:
+                    # Out of frames: pick the reading with the highest summed confidence
+                    best = max(votes[label].items(), key=lambda kv: kv[1][1])[0]
+                count, conf_sum = votes[label][best]
+                pending.discard(label)
+                if self.ocr_cache and label in keys:
+                    self.ocr_cache.put(keys[label], best)
+                yield label, best, round(conf_sum / count, 1)
+
+            if not pending:
+                break
+
+    def _timed_recognize(self, label, image, profile, with_conf=False):
+        """_recognize / _recognize_conf recorded as a per-region span (vision.ocr.<label>)."""
+        with metrics.span(f"vision.ocr.{label}"):
+            if with_conf:
+                return self._recognize_conf(image, profile)
+            return self._recognize(image, profile)
+
+    def _recognize_conf(self, image, profile):
+        """Like _recognize, but returns (text, confidence)."""
+        try:
+            return self.ocr.recognize_with_conf(image, lang=profile['lang'], psm=profile['psm'], whitelist=profile['whitelist'])
+        except OCREngineError:
+            raise
+        except Exception as e:
+            return "", 0.0 # Fail silently for partial errors
+
+    def _profile_variant(self, profile):
+        """Cache key component for the OCR settings of a region."""
+        return f"{profile['lang']}|{profile['psm']}|{profile['whitelist']}|{profile['detect_script']}"
+
+    def _preprocess(self, roi, profile=None):
+        """Turns a grayscale crop into a black-on-white binary image for OCR."""
+        profile = profile or self.DEFAULT_PROFILE
+        # Preprocessing for better OCR
+        # 1. Rescaling (upscaling helps small text)
+        scale = profile['scale']
+        gray = roi if scale == 1 else cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+
+        # 2. Thresholding (Assume white text on dark background for games)
+        #    Adjust threshold as needed. 150-200 is often good for white text.
+        if profile['threshold'] == "otsu":
+            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        else:
+            _, thresh = cv2.threshold(gray, profile['threshold'], 255, cv2.THRESH_BINARY)
+        
+        # 3. Invert if needed? Tesseract likes black text on white bg usually.
+        #    Let's invert to make it black text on white.
+        return cv2.bitwise_not(thresh)
+
+    def _resolve_profile(self, image, profile):
+        """
+        Applies script detection for regions that ask for it: the region is then recognized
+        with the smallest language set for the detected script instead of the full set.
+        """
+        if not profile['detect_script']:
+            return profile
+        try:
+            script = self.ocr.detect_script(image)
+        except OCREngineError:
+            raise
+        except Exception:
+            script = None
+        lang = self.SCRIPT_LANGS.get(script)
+        if not lang:
+            return profile
+        return {**profile, "lang": lang}
+
+    def _recognize_batched(self, jobs, gap=24, margin=8, with_conf=False):
+        """
+        Stitches preprocessed ROIs into tiled pages (one region per row, separated by blank
+        white bands), runs a single OCR pass per page and maps words back to labels by their
+        bounding boxes. Regions are grouped into one page per (lang, whitelist).
+        with_conf: return (text, mean word confidence) per label instead of text.
+        """
+        pages = {}
+        for label, (roi, profile) in jobs.items():
+            pages.setdefault((profile['lang'], profile['whitelist']), {})[label] = roi
 
+        results = {}
+        for (lang, whitelist), prepared in pages.items():
+            results.update(self._recognize_page(prepared, lang, whitelist, gap, margin, with_conf))
         return results
 
+    def _recognize_page(self, prepared, lang, whitelist, gap, margin, with_conf=False):
+        labels = list(prepared.keys())
+        page_w = max(roi.shape[1] for roi in prepared.values()) + margin * 2
+        page_h = sum(roi.shape[0] for roi in prepared.values()) + gap * (len(labels) + 1)
+        page = np.full((page_h, page_w), 255, dtype=np.uint8)
+
+        bands = [] # (y_start, y_end, label) including half of the surrounding gaps
+        y = gap
+        for label in labels:
+            roi = prepared[label]
+            h, w = roi.shape[:2]
+            page[y:y+h, margin:margin+w] = roi
+            bands.append((y - gap // 2, y + h + gap // 2, label))
+            y += h + gap
+
+        try:
+            # psm 6: Assume a single uniform block of text
+            words = self.ocr.recognize_words(page, lang=lang, psm=6, whitelist=whitelist)
+        except OCREngineError:
+            raise
+        except Exception as e:
+            print(f"[VisionProcessor] Batched OCR failed, falling back to per-region: {e}")
+            profile = {**self.DEFAULT_PROFILE, "lang": lang, "whitelist": whitelist}
+            recognize = self._recognize_conf if with_conf else self._recognize
+            return {label: recognize(roi, profile) for label, roi in prepared.items()}
+
+        grouped = {label: [] for label in labels}
+        for word in words:
+            cy = word['y'] + word['h'] / 2
+            for y0, y1, label in bands:
+                if y0 <= cy < y1:
+                    grouped[label].append(word)
+                    break
+
+        results = {}
+        for label, ws in grouped.items():
+            text = " ".join(w['text'] for w in sorted(ws, key=lambda w: w['x']))
+            if with_conf:
+                conf = sum(w['conf'] for w in ws) / len(ws) if ws else 0.0
+                results[label] = (text, conf)
+            else:
+                results[label] = text
+        return results
+
+    def _recognize(self, image, profile=None):
+        """Runs OCR on one preprocessed image with the region's lang/psm/whitelist."""
+        profile = profile or self.DEFAULT_PROFILE
+        try:
+            return self.ocr.recognize(image, lang=profile['lang'], psm=profile['psm'], whitelist=profile['whitelist'])
+        except OCREngineError:
+            raise
+        except Exception as e:
+            return "" # Fail silently for partial errors
+
     def debug_show_regions(self):
         """Show a window with rectangles drawn for debugging."""
         if not self.regions:
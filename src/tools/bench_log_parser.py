@@ -0,0 +1,85 @@
+"""
+Micro-benchmark for LogWatcher parsing.
+Generates a synthetic Player.log (default 300 MB) and reports lines/sec for
+the block parser (check_updates) and the per-line parser (_parse_line).
+
+Usage: python src/tools/bench_log_parser.py [size_mb]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.LogWatcher import LogWatcher
+
+NOISE = [
+    "[Network] Ping: {n}ms",
+    "(Filename: C:\\buildslave\\unity\\build\\Runtime/Export/Debug/Debug.bindings.h Line: 35)",
+    "UnityEngine.Logger:Log(LogType, Object)",
+    "CharacterAnimator: SetTrigger Attack_{n}",
+    "ItemBox opened: itemCode={n}",
+    "",
+    "WebRequest complete: https://example.invalid/api/{n} 200",
+]
+EVENTS = [
+    "GlobalUserData:SetMatchingMode userNum:{n} Invoked: Rank",
+    "Selected MatchingRegion : Asia",
+    "SceneManager:LoadScene Loading",
+    "SceneManager:LoadScene Lobby",
+    "GameClient created",
+]
+
+
+def generate(path, size_mb, event_ratio=0.001):
+    rnd = random.Random(0)
+    target = size_mb * 1024 * 1024
+    lines = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        written = 0
+        while written < target:
+            block = []
+            for _ in range(10000):
+                pool = EVENTS if rnd.random() < event_ratio else NOISE
+                block.append(rnd.choice(pool).format(n=rnd.randint(0, 99999)))
+            text = "\n".join(block) + "\n"
+            f.write(text)
+            written += len(text)
+            lines += len(block)
+    return lines
+
+
+def bench(path, lines):
+    # Block parser (what the watcher actually runs)
+    watcher = LogWatcher(log_path=path, patterns_file=None)
+    watcher.open_log(from_start=True)
+    start = time.perf_counter()
+    events = watcher.check_updates()
+    elapsed = time.perf_counter() - start
+    print(f"block parser : {lines / elapsed:,.0f} lines/sec ({elapsed:.2f}s, {len(events)} events)")
+
+    # Per-line parser, for comparison
+    watcher.open_log(from_start=True)
+    start = time.perf_counter()
+    count = 0
+    for line in watcher.read_lines():
+        if watcher._parse_line(line):
+            count += 1
+    elapsed = time.perf_counter() - start
+    print(f"per-line     : {lines / elapsed:,.0f} lines/sec ({elapsed:.2f}s, {count} events)")
+    watcher.file_handle.close()
+
+
+if __name__ == "__main__":
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    fd, path = tempfile.mkstemp(suffix="_Player.log")
+    os.close(fd)
+    try:
+        print(f"Generating {size_mb} MB synthetic Player.log...")
+        lines = generate(path, size_mb)
+        print(f"{lines:,} lines")
+        bench(path, lines)
+    finally:
+        os.remove(path)
@@ -0,0 +1,70 @@
+"""
+Benchmark for the columnar stats engine.
+Builds thousands of synthetic /v1/user/games entries and compares the vectorized
+summary with the previous per-game Python loop, plus incremental appends.
+
+Usage: python src/tools/bench_stats_engine.py [games]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.StatsEngine import GameHistory, summarize
+
+
+def synthetic_games(count, start_id=10_000_000):
+    rnd = random.Random(0)
+    return [{
+        "gameId": start_id - i,
+        "gameRank": rnd.randint(1, 8),
+        "playerKill": rnd.randint(0, 12),
+        "playerAssistant": rnd.randint(0, 10),
+        "damageToPlayer": rnd.randint(0, 40000),
+        "characterNum": rnd.randint(1, 70),
+        "mmrGain": rnd.randint(-60, 80),
+    } for i in range(count)]
+
+
+def loop_summary(games):
+    """The previous _summarize_stats implementation (basic metrics only)."""
+    wins = top3 = total_kills = 0
+    chars = {}
+    for game in games:
+        if game['gameRank'] == 1:
+            wins += 1
+        if game['gameRank'] <= 3:
+            top3 += 1
+        total_kills += game['playerKill']
+        chars[game['characterNum']] = chars.get(game['characterNum'], 0) + 1
+    top_char = sorted(chars.items(), key=lambda x: x[1], reverse=True)[0][0]
+    n = len(games)
+    return {"win_rate": wins / n * 100, "top3_rate": top3 / n * 100, "avg_kills": total_kills / n, "top_char_id": top_char}
+
+
+def timeit(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    games = synthetic_games(count)
+    history = GameHistory.from_games(games)
+
+    print(f"{count} synthetic games")
+    print(f"load into columns   : {timeit(lambda: GameHistory.from_games(games)):.2f} ms")
+    print(f"vectorized summary  : {timeit(lambda: summarize(history)):.2f} ms (all metrics)")
+    print(f"python loop summary : {timeit(lambda: loop_summary(games)):.2f} ms (basic metrics only)")
+
+    # Incremental refresh: 10 new games on top of the cached history
+    newer = synthetic_games(10, start_id=games[0]["gameId"] + 10)
+    def refresh():
+        h = GameHistory({k: v.copy() for k, v in history.columns.items()})
+        h.add_newer(newer)
+        return summarize(h)
+    print(f"append 10 + summary : {timeit(refresh):.2f} ms")
@@ -0,0 +1,78 @@
+"""
+Regression checks for LogWatcher's incremental reading and truncation/rotation detection.
+Exits with status 1 if any check fails.
+
+Usage: python src/tools/check_log_watcher.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.LogWatcher import LogWatcher
+
+LOADING = "SceneManager:LoadScene Loading\n"
+LOBBY = "SceneManager:LoadScene Lobby\n"
+
+
+def append(path, text):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(text)
+
+
+def values(events):
+    return [e["value"] for e in events]
+
+
+def check_partial_last_line(path):
+    """A short unfinished last line must not look like a rewrite (no replay of old events)."""
+    append(path, LOADING * 3)
+    watcher = LogWatcher(log_path=path, patterns_file=None)
+    watcher.open_log()
+    append(path, "partial")
+    results = [watcher.check_updates() for _ in range(3)]
+    append(path, " line\n" + LOBBY)
+    results.append(watcher.check_updates())
+    watcher.file_handle.close()
+    got = [values(r) for r in results]
+    return got == [[], [], [], ["lobby"]] or f"got {got}"
+
+
+def check_truncate(path):
+    """Truncated and rewritten in place past the old position: reread from the start."""
+    append(path, LOBBY * 2)
+    watcher = LogWatcher(log_path=path, patterns_file=None)
+    watcher.open_log()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(LOADING * 4)
+    got = values(watcher.check_updates())
+    watcher.file_handle.close()
+    return got == ["loading_screen"] * 4 or f"got {got}"
+
+
+def check_recreate(path):
+    """Log deleted and recreated (game restart): read the new file from the start."""
+    append(path, LOBBY)
+    watcher = LogWatcher(log_path=path, patterns_file=None)
+    watcher.open_log()
+    os.remove(path)
+    append(path, LOADING)
+    got = values(watcher.check_updates())
+    watcher.file_handle.close()
+    return got == ["loading_screen"] or f"got {got}"
+
+
+if __name__ == "__main__":
+    failed = 0
+    for check in (check_partial_last_line, check_truncate, check_recreate):
+        fd, path = tempfile.mkstemp(suffix="_Player.log")
+        os.close(fd)
+        try:
+            result = check(path)
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        print(f"{'ok  ' if result is True else 'FAIL'} {check.__name__}" + ("" if result is True else f": {result}"))
+        failed += result is not True
+    sys.exit(1 if failed else 0)
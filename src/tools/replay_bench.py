@@ -0,0 +1,391 @@
+"""
+Offline replay benchmark for the full agent pipeline (no game required).
+
+- A recorded Player.log is appended to a temp log file at real or accelerated speed
+  (lines may carry a "[+seconds] " offset prefix; other lines follow the previous one).
+- Screenshots are served from fixture images instead of mss; the image switches when the
+  replayed log reaches a scene (e.g. "loading_screen": "loading.png").
+- EternalReturnAPI and LocalLLMHandler talk to local stub servers with configurable latency.
+- Reports the time from writing the loading-screen line to the final advice, plus the
+  per-stage spans collected by components.Metrics. A run only counts as completed if players
+  were resolved and advice was delivered; otherwise it is reported as failed.
+
+Without a manifest a synthetic scenario is generated (8 players, char select + loading).
+Manifest (JSON, paths relative to it):
+    {"log": "Player.log", "config_dir": "config",
+     "screens": {"char_select": "char_select.png", "loading_screen": "loading.png"},
+     "players": ["Nickname1", "Nickname2"]}
+
+Usage: python src/tools/replay_bench.py [--manifest m.json] [--speed 4] [--runs 3]
+                                        [--api-latency 0.15] [--llm-first-token 0.8] [--json out.json]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from components.LogPatterns import PatternMatcher, DEFAULT_PATTERNS
+from components.Metrics import metrics
+
+OFFSET = re.compile(r"^\[\+(\d+(?:\.\d+)?)\]\s?")
+
+# --- Fixture screen (mss replacement) ---
+
+class _Shot:
+    def __init__(self, bgra):
+        self.raw = bgra.tobytes()
+        self.height, self.width = bgra.shape[:2]
+
+class FixtureScreen:
+    """Serves grabs from the current fixture image (mss-compatible: monitors + grab)."""
+
+    def __init__(self, width=1920, height=1080):
+        self.width, self.height = width, height
+        self.image = np.zeros((height, width, 4), dtype=np.uint8) # Black until a scene is shown
+        self.lock = threading.Lock()
+
+    @property
+    def monitors(self):
+        monitor = {"left": 0, "top": 0, "width": self.width, "height": self.height}
+        return [monitor, monitor]
+
+    def show(self, path):
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"[Replay] Fixture image not found: {path}")
+            return
+        image = cv2.resize(image, (self.width, self.height)) if image.shape[:2] != (self.height, self.width) else image
+        with self.lock:
+            self.image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+
+    def grab(self, rect):
+        with self.lock:
+            x, y = rect["left"], rect["top"]
+            return _Shot(np.ascontiguousarray(self.image[y:y + rect["height"], x:x + rect["width"]]))
+
+# --- Stub servers ---
+
+class _StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, like the real API
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        url = urlparse(self.path)
+        players = self.server.players
+
+        if url.path == "/v1/user/nickname":
+            name = parse_qs(url.query).get("query", [""])[0]
+            if name not in players:
+                return self._send(404, {"code": 404, "message": "Not Found"})
+            return self._send(200, {"code": 200, "user": {"userNum": players[name], "nickname": name}})
+
+        if url.path.startswith("/v1/user/games/"):
+            user_num = int(url.path.rsplit("/", 1)[1])
+            rnd = random.Random(user_num)
+            games = [{
+                "gameId": 50_000_000 - i * 7 - rnd.randint(0, 6),
+                "gameRank": rnd.randint(1, 8),
+                "playerKill": rnd.randint(0, 10),
+                "playerAssistant": rnd.randint(0, 8),
+                "damageToPlayer": rnd.randint(1000, 30000),
+                "characterNum": rnd.randint(1, 10),
+                "mmrGain": rnd.randint(-40, 60),
+            } for i in range(20)]
+            return self._send(200, {"code": 200, "userGames": games})
+
+        if url.path == "/v2/data/hash":
+            return self._send(200, {"code": 200, "data": {"Character": "replay", "ItemWeapon": "replay",
+                                                          "ItemArmor": "replay", "ItemConsumable": "replay"}})
+        if url.path == "/v2/data/Character":
+            return self._send(200, {"code": 200, "data": [{"code": i, "name": f"Character{i}"} for i in range(1, 11)]})
+        if url.path.startswith("/v2/data/"):
+            return self._send(200, {"code": 200, "data": []})
+        return self._send(404, {"code": 404, "message": "Not Found"})
+
+class _StubOllamaHandler(BaseHTTPRequestHandler):
+    ADVICE = "相手の勝率が高いプレイヤーがいます。序盤は無理に戦わず、装備を整えてから動きましょう。弱いプレイヤーを見つけたら積極的に狙ってください。"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not body.get("messages") and not body.get("prompt"):
+            time.sleep(self.server.load_latency) # Warm-up: model load
+            data = json.dumps({"done": True}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        prompt = body.get("prompt") or " ".join(m.get("content", "") for m in body["messages"])
+        key = "response" if "prompt" in body else "message"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+
+        time.sleep(self.server.first_token)
+        text = self.ADVICE
+        for i in range(0, len(text), 3):
+            token = text[i:i + 3]
+            chunk = {"response": token} if key == "response" else {"message": {"content": token}}
+            self.wfile.write((json.dumps(chunk, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_interval)
+        done = {"done": True, "context": [1, 2, 3], "prompt_eval_count": len(prompt) // 2}
+        self.wfile.write((json.dumps(done) + "\n").encode("utf-8"))
+
+def start_server(handler, **attrs):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    for name, value in attrs.items():
+        setattr(server, name, value)
+    threading.Thread(target=server.serve_forever, name=handler.__name__, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# --- Scenario ---
+
+def synthetic_scenario(directory, count=8):
+    """Writes a vision_map, a fixture screenshot with rendered names and a recorded log."""
+    names = ["Hideonbush", "SakuraMochi", "Tiger777", "nightowl", "KOREA1", "BlueFalcon", "Zephyrus", "mint_tea",
+             "Rosalind", "ironclad"][:count]
+    config_dir = os.path.join(directory, "config")
+    os.makedirs(config_dir, exist_ok=True)
+
+    image = np.full((1080, 1920, 3), 30, dtype=np.uint8)
+    regions = {}
+    for i, name in enumerate(names):
+        x, y = 160 + (i % 4) * 420, 700 + (i // 4) * 120
+        regions[f"player{i + 1}_name"] = {"x": x, "y": y, "w": 360, "h": 48}
+        cv2.putText(image, name, (x + 10, y + 36), cv2.FONT_HERSHEY_SIMPLEX, 1.1, (255, 255, 255), 2, cv2.LINE_AA)
+    cv2.rectangle(image, (0, 0), (1919, 120), (90, 60, 40), -1) # Some non-uniform background
+    for filename in ("vision_map.json", "vision_map_char_select.json"):
+        with open(os.path.join(config_dir, filename), 'w', encoding='utf-8') as f:
+            json.dump(regions, f)
+    screen_path = os.path.join(directory, "lobby.png")
+    cv2.imwrite(screen_path, image)
+
+    noise = ["[Network] Ping: 42ms", "UnityEngine.Logger:Log(LogType, Object)", "CharacterAnimator: SetTrigger Idle"]
+    lines = [
+        "[+0.0] GlobalUserData:SetMatchingMode userNum:1 Invoked: Rank",
+        "[+0.2] Selected MatchingRegion : Asia",
+        "[+1.0] SceneManager:LoadScene CharacterSelect",
+    ] + [f"[+{1.5 + i * 0.5:.1f}] {noise[i % len(noise)]}" for i in range(8)] + [
+        "[+6.0] SceneManager:LoadScene Loading",
+    ]
+    log_path = os.path.join(directory, "Player.log")
+    with open(log_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+
+    return {
+        "log": log_path,
+        "config_dir": config_dir,
+        "screens": {"char_select": screen_path, "loading_screen": screen_path},
+        "players": names,
+    }
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    manifest["log"] = os.path.join(base, manifest["log"])
+    manifest["config_dir"] = os.path.join(base, manifest.get("config_dir", "config"))
+    manifest["screens"] = {scene: os.path.join(base, p) for scene, p in manifest.get("screens", {}).items()}
+    return manifest
+
+def read_recording(path):
+    """Returns [(offset_seconds, line)] from a recorded log."""
+    entries = []
+    offset = 0.0
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.rstrip("\n")
+            match = OFFSET.match(line)
+            if match:
+                offset = float(match.group(1))
+                line = line[match.end():]
+            entries.append((offset, line))
+    return entries
+
+# --- Replay ---
+
+def replay(entries, log_path, screen, screens, speed, screen_delay, marks, stop_event):
+    """Appends the recorded lines to log_path on schedule and switches fixture screens."""
+    matcher = PatternMatcher(DEFAULT_PATTERNS)
+    start = time.perf_counter()
+    with open(log_path, 'a', encoding='utf-8') as f:
+        for offset, line in entries:
+            wait = start + offset / speed - time.perf_counter()
+            if wait > 0 and stop_event.wait(wait):
+                return
+            f.write(line + "\n")
+            f.flush()
+
+            event = matcher.parse_line(line)
+            if event and event["type"] == "state_change":
+                marks.setdefault(event["value"], time.perf_counter())
+                image = screens.get(event["value"])
+                if image:
+                    # The game draws the scene shortly after logging it
+                    threading.Timer(screen_delay / speed, screen.show, args=(image,)).start()
+
+def run_once(args, manifest, api_url, llm_url, workdir):
+    from MainAgent import MainAgent
+
+    os.environ["ER_API_KEY"] = "replay"
+    os.environ["ER_API_BASE_URL"] = api_url
+    os.environ["ER_API_RATE_LIMIT"] = str(args.api_rate)
+    os.environ["ER_API_BURST"] = str(args.api_burst)
+    os.environ["OLLAMA_URL"] = f"{llm_url}/api/chat"
+    os.environ["ER_CACHE_PATH"] = os.path.join(workdir, "player_cache.db")
+    os.environ["ER_GAME_DATA_PATH"] = os.path.join(workdir, "game_data")
+    metrics.reset()
+
+    log_path = os.path.join(workdir, "Player.log")
+    open(log_path, 'w').close()
+    screen = FixtureScreen()
+    agent = MainAgent(log_path=log_path, config_dir=manifest["config_dir"], screen=screen, ocr_backend=args.ocr)
+
+    done = threading.Event()
+    finished = {}
+    def on_advice(job):
+        if "advice" not in finished:
+            finished["advice"] = time.perf_counter()
+            finished["players"] = len(job.session) if job.session else 0
+            finished["sentences"] = len(job.advice)
+        done.set()
+    agent.on_advice = on_advice
+
+    stop_event = threading.Event()
+    runner = threading.Thread(target=agent.run, args=(stop_event,), name="agent", daemon=True)
+    runner.start()
+    time.sleep(args.startup) # Let the watcher open the log and the warm-ups start
+
+    marks = {}
+    replayer = threading.Thread(target=replay, name="replay", daemon=True, args=(
+        read_recording(manifest["log"]), log_path, screen, manifest["screens"],
+        args.speed, args.screen_delay, marks, stop_event))
+    replayer.start()
+
+    advised = done.wait(args.timeout)
+    stop_event.set()
+    replayer.join()
+    runner.join(timeout=5)
+
+    # A scan that resolved nobody (OCR/API broken) or produced no advice is a failure,
+    # not a fast run
+    players = finished.get("players", 0)
+    sentences = finished.get("sentences", 0)
+    if not advised:
+        error = "timed out"
+    elif not players:
+        error = "no players resolved"
+    elif not sentences:
+        error = "no advice sentences"
+    else:
+        error = None
+
+    spans, counters = metrics.session_summary()
+    result = {"completed": error is None, "players": players, "sentences": sentences,
+              "spans": spans, "counters": counters}
+    if error:
+        result["error"] = error
+    elif "loading_screen" in marks:
+        result["loading_to_advice_s"] = round(finished["advice"] - marks["loading_screen"], 3)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded match through the full agent pipeline.")
+    parser.add_argument("--manifest", help="Replay manifest (default: synthetic scenario)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed multiplier")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--warm-cache", action="store_true", help="Keep the player cache between runs")
+    parser.add_argument("--api-latency", type=float, default=0.15, help="Stub API response delay (s)")
+    parser.add_argument("--api-rate", type=float, default=1.0, help="Client rate limit (req/s)")
+    parser.add_argument("--api-burst", type=int, default=1)
+    parser.add_argument("--llm-first-token", type=float, default=0.8, help="Stub Ollama time to first token (s)")
+    parser.add_argument("--llm-token-interval", type=float, default=0.02, help="Stub Ollama delay per token (s)")
+    parser.add_argument("--llm-load", type=float, default=2.0, help="Stub Ollama model load time (s)")
+    parser.add_argument("--screen-delay", type=float, default=0.3, help="Scene drawn this long after its log line (s)")
+    parser.add_argument("--startup", type=float, default=1.0, help="Seconds between agent start and replay")
+    parser.add_argument("--ocr", default=None, help="OCR backend (default: OCR_BACKEND / auto)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="Write all results to this file")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="erai_replay_")
+    try:
+        manifest = load_manifest(args.manifest) if args.manifest else synthetic_scenario(os.path.join(tmp, "scenario"))
+        players = {name: 1000 + i for i, name in enumerate(manifest.get("players", []))}
+        api, api_url = start_server(_StubAPIHandler, latency=args.api_latency, players=players)
+        llm, llm_url = start_server(_StubOllamaHandler, first_token=args.llm_first_token,
+                                    token_interval=args.llm_token_interval, load_latency=args.llm_load)
+
+        metrics.enable()
+        metrics.path = os.path.join(tmp, "metrics.jsonl")
+        results = []
+        for run in range(args.runs):
+            workdir = os.path.join(tmp, "cache" if args.warm_cache else f"run{run}")
+            os.makedirs(workdir, exist_ok=True)
+            print(f"\n===== Replay run {run + 1}/{args.runs} =====")
+            results.append(run_once(args, manifest, api_url, llm_url, workdir))
+
+        api.shutdown()
+        llm.shutdown()
+
+        print("\n===== Replay results =====")
+        for run, result in enumerate(results, 1):
+            e2e = result.get("loading_to_advice_s")
+            counts = f"{result['players']} players resolved, {result['sentences']} advice sentences"
+            if not result["completed"]:
+                print(f"run {run}: FAILED ({result['error']}; {counts})")
+            elif e2e is not None:
+                print(f"run {run}: loading screen -> final advice {e2e:.2f}s ({counts})")
+            else:
+                print(f"run {run}: completed, no loading screen in the recording ({counts})")
+        totals = [r["loading_to_advice_s"] for r in results if "loading_to_advice_s" in r]
+        if totals:
+            print(f"loading screen -> final advice: median {statistics.median(totals):.2f}s, "
+                  f"min {min(totals):.2f}s, max {max(totals):.2f}s over {len(totals)} runs")
+
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({"args": vars(args), "runs": results}, f, ensure_ascii=False, indent=2)
+            print(f"Results written to {args.json}")
+
+        failed = sum(1 for r in results if not r["completed"])
+        if failed:
+            print(f"{failed} of {len(results)} runs failed.")
+            sys.exit(1)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()